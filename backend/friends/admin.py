@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import FriendRequest, Notification
+from .models import FriendRequest, Friendship, Notification
 
 admin.site.register(FriendRequest)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(Notification)
+admin.site.register(Friendship)
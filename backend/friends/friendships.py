@@ -0,0 +1,63 @@
+# friends/friendships.py
+from django.db.models import Q
+from users.models import CustomUser
+from .models import Friendship, FriendRequest
+
+def add_friendship(user_id, friend_id):
+    Friendship.objects.bulk_create([
+        Friendship(user_id=user_id, friend_id=friend_id),
+        Friendship(user_id=friend_id, friend_id=user_id),
+    ], ignore_conflicts=True)
+
+def remove_friendship(user_id, friend_id):
+    Friendship.objects.filter(
+        Q(user_id=user_id, friend_id=friend_id) | Q(user_id=friend_id, friend_id=user_id)
+    ).delete()
+
+def sync_friendship(user_id, friend_id):
+    """Make the edge match whether an accepted request exists between the pair in either direction"""
+    accepted = FriendRequest.objects.filter(
+        Q(sender_id=user_id, receiver_id=friend_id) | Q(sender_id=friend_id, receiver_id=user_id),
+        status='accepted'
+    ).exists()
+    if accepted:
+        add_friendship(user_id, friend_id)
+    else:
+        remove_friendship(user_id, friend_id)
+
+def friend_ids(user):
+    return Friendship.objects.filter(user=user).values_list('friend_id', flat=True)
+
+def friends_of(user):
+    """The user's friends as a CustomUser queryset (one query with a subquery)"""
+    return CustomUser.objects.filter(id__in=friend_ids(user))
+
+def are_friends(user, other_user_id):
+    return Friendship.objects.filter(user=user, friend_id=other_user_id).exists()
+
+def friendship_statuses(user, user_ids):
+    """
+    Resolve the user's friendship status with each of user_ids from one query.
+    Returns (statuses, received_request_ids): statuses maps every id to 'friend', 'pending_sent',
+    'pending_received' or 'not_friend'; received_request_ids maps ids with a pending request to the user.
+    """
+    statuses = dict.fromkeys(user_ids, 'not_friend')
+    received_request_ids = {}
+    requests = FriendRequest.objects.filter(
+        Q(sender=user, receiver_id__in=user_ids) | Q(sender_id__in=user_ids, receiver=user),
+        status__in=['accepted', 'pending']
+    ).values_list('id', 'sender_id', 'receiver_id', 'status')
+
+    for request_id, sender_id, receiver_id, status in requests:
+        sent = sender_id == user.id
+        other_id = receiver_id if sent else sender_id
+        if status == 'accepted':
+            statuses[other_id] = 'friend'
+        elif statuses[other_id] == 'friend':
+            continue
+        elif sent:
+            statuses[other_id] = 'pending_sent'
+        else:
+            statuses[other_id] = 'pending_received'
+            received_request_ids[other_id] = request_id
+    return statuses, received_request_ids
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from friends.models import Friendship, FriendSuggestion
+from friends.suggestions import compute_suggestions
+
+class Command(BaseCommand):
+    help = 'Recompute "people you may know" suggestions from mutual friends for every user with friends'
+
+    def handle(self, *args, **options):
+        # Users without friends have no friends-of-friends
+        FriendSuggestion.objects.exclude(user_id__in=Friendship.objects.values('user_id')).delete()
+
+        user_ids = Friendship.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
+        users = 0
+        suggestions = 0
+        for user_id in user_ids.iterator(chunk_size=1000):
+            suggestions += compute_suggestions(user_id)
+            users += 1
+            if users % 1000 == 0:
+                self.stdout.write(f"Processed {users} users...")
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {suggestions} suggestions for {users} users"))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from friends.models import Notification
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than the retention period, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep read notifications for this many days')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per batch')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Notification.objects.filter(is_read=True, last_at__lt=cutoff)
+
+        deleted = 0
+        while True:
+            # Short batches keep each delete transaction (and its locks) small
+            batch_ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not batch_ids:
+                break
+            Notification.objects.filter(pk__in=batch_ids).delete()
+            deleted += len(batch_ids)
+            self.stdout.write(f"Deleted {deleted} notifications...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {deleted} read notifications older than {options['days']} days"
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+def merge_message_notifications(apps, schema_editor):
+    """Fold duplicate message notifications per (user, conversation) into the newest row"""
+    Notification = apps.get_model('friends', 'Notification')
+    duplicates = Notification.objects.filter(
+        notification_type='message',
+        conversation__isnull=False
+    ).values('user_id', 'conversation_id').annotate(rows=models.Count('id')).filter(rows__gt=1)
+
+    for duplicate in duplicates.iterator():
+        rows = list(Notification.objects.filter(
+            notification_type='message',
+            user_id=duplicate['user_id'],
+            conversation_id=duplicate['conversation_id']
+        ).order_by('-last_at', '-id'))
+        keep = rows[0]
+        unread = [row for row in rows if not row.is_read]
+        if unread:
+            keep.is_read = False
+            keep.count = sum(row.count for row in unread)
+            keep.save(update_fields=['is_read', 'count'])
+        Notification.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0002_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_message_notifications, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'last_at'], name='friends_not_is_read_f7dc5f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type', 'message')), fields=('user', 'conversation'), name='unique_message_notification'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_friendships(apps, schema_editor):
+    """Create both friendship edges for every accepted friend request"""
+    FriendRequest = apps.get_model('friends', 'FriendRequest')
+    Friendship = apps.get_model('friends', 'Friendship')
+    edges = []
+    for sender_id, receiver_id in FriendRequest.objects.filter(status='accepted').values_list('sender_id', 'receiver_id').iterator():
+        edges.append(Friendship(user_id=sender_id, friend_id=receiver_id))
+        edges.append(Friendship(user_id=receiver_id, friend_id=sender_id))
+    Friendship.objects.bulk_create(edges, batch_size=1000, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('friends', '0003_notification_store_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user', 'friend'), name='unique_friendship'),
+        ),
+        migrations.RunPython(backfill_friendships, migrations.RunPython.noop),
+    ]
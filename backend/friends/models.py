@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from users.models import CustomUser
 
 class FriendRequest(models.Model):
@@ -20,6 +21,38 @@ class FriendRequest(models.Model):
     def __str__(self):
         return f"{self.sender.username} -> {self.receiver.username} ({self.status})"
 
+class Friendship(models.Model):
+    """One row per direction of an accepted friendship, kept in sync with FriendRequest"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='friendships')
+    friend = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'friend'], name='unique_friendship'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} <-> {self.friend_id}"
+
+class FriendSuggestion(models.Model):
+    """A precomputed "people you may know" entry, ranked by mutual friends"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='friend_suggestions')
+    suggested_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    mutual_friends = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested_user'], name='unique_friend_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_friends']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.suggested_user_id} ({self.mutual_friends} mutual)"
+
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('friend_request', 'Friend Request'),
@@ -32,8 +65,27 @@ class Notification(models.Model):
     notification_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     content = models.CharField(max_length=255)
     related_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_notifications', null=True, blank=True)
+    conversation = models.ForeignKey('messaging.Conversation', on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
     is_read = models.BooleanField(default=False)
+    # Repeated unread notifications (e.g. messages in one conversation) are folded into one row
+    count = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'last_at']),
+            # Retention purge of old read notifications
+            models.Index(fields=['is_read', 'last_at']),
+        ]
+        constraints = [
+            # One coalesced message notification per user and conversation
+            models.UniqueConstraint(
+                fields=['user', 'conversation'],
+                condition=models.Q(notification_type='message'),
+                name='unique_message_notification'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.notification_type} - {self.created_at}"
\ No newline at end of file
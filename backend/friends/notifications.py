@@ -0,0 +1,107 @@
+# friends/notifications.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from users.background import retry_on_lock
+from users.counters import invalidate_notification_counts
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_BATCH_SIZE = 500
+
+# A single worker keeps fan-out jobs in order, so coalescing does not race within a process.
+# Jobs are held in memory only: anything queued or running when the process exits is lost.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+
+def coalesce_key(related_user_id=None, conversation_id=None):
+    """Fields identifying the row a coalesced notification folds into"""
+    if conversation_id:
+        return {'conversation_id': conversation_id}
+    return {'related_user_id': related_user_id, 'conversation_id': None}
+
+def _deliver_batch(batch, notification_type, content, related_user_id, conversation_id, coalesce, now):
+    """Coalesce into existing rows and create the rest, as one transaction"""
+    coalesced = 0
+    with transaction.atomic():
+        if coalesce:
+            existing = Notification.objects.filter(
+                user_id__in=batch,
+                notification_type=notification_type,
+                **coalesce_key(related_user_id, conversation_id)
+            )
+            existing_ids = set(existing.values_list('user_id', flat=True))
+            if existing_ids:
+                update = {'content': content, 'related_user_id': related_user_id, 'last_at': now}
+                coalesced += existing.filter(is_read=False).update(count=F('count') + 1, **update)
+                coalesced += existing.filter(is_read=True).update(count=1, is_read=False, **update)
+                batch = [user_id for user_id in batch if user_id not in existing_ids]
+
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type=notification_type,
+                content=content,
+                related_user_id=related_user_id,
+                conversation_id=conversation_id,
+                last_at=now
+            )
+            for user_id in batch
+        ])
+    return len(batch), coalesced
+
+def deliver_notifications(recipient_ids, notification_type, content, related_user_id=None, conversation_id=None, coalesce=False):
+    """
+    Write one notification per recipient in bulk batches.
+    With coalesce, each recipient keeps a single row per conversation (or per related user):
+    unread rows count up, read rows become unread again with a fresh count.
+    """
+    recipient_ids = list(dict.fromkeys(recipient_ids))
+    now = timezone.now()
+    created = 0
+    coalesced = 0
+
+    for start in range(0, len(recipient_ids), NOTIFICATION_BATCH_SIZE):
+        batch = recipient_ids[start:start + NOTIFICATION_BATCH_SIZE]
+        args = (batch, notification_type, content, related_user_id, conversation_id, coalesce, now)
+        try:
+            batch_created, batch_coalesced = retry_on_lock(_deliver_batch, *args)
+        except IntegrityError:
+            if not coalesce:
+                raise
+            # Another job created one of the coalesced rows first; the second pass folds into it
+            batch_created, batch_coalesced = retry_on_lock(_deliver_batch, *args)
+        created += batch_created
+        coalesced += batch_coalesced
+
+    # Bulk writes do not send signals
+    invalidate_notification_counts(recipient_ids)
+
+    return created, coalesced
+
+def _run_job(job):
+    try:
+        deliver_notifications(**job)
+    except Exception as e:
+        logger.error(f"Error delivering {job['notification_type']} notifications: {e}")
+    finally:
+        close_old_connections()
+
+def notify(recipient_ids, notification_type, content, related_user=None, conversation=None, coalesce=False):
+    """
+    Queue a notification fan-out and return immediately.
+    The job starts after the current transaction commits and runs on a background worker;
+    it is retried while the database is locked, but is lost if the process stops first.
+    """
+    job = {
+        'recipient_ids': list(recipient_ids),
+        'notification_type': notification_type,
+        'content': content,
+        'related_user_id': related_user.id if related_user else None,
+        'conversation_id': conversation.id if conversation else None,
+        'coalesce': coalesce,
+    }
+    if job['recipient_ids']:
+        transaction.on_commit(lambda: _executor.submit(_run_job, job))
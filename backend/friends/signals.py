@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.counters import invalidate_notification_counts
+from users.models import UserBlock
+from .friendships import sync_friendship
+from .suggestions import drop_suggestions, refresh_suggestions
+from .models import FriendRequest, Notification
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def refresh_notification_count(sender, instance, **kwargs):
+    """Drop the cached unread count when a notification is created, read or removed"""
+    invalidate_notification_counts([instance.user_id])
+
+@receiver(post_save, sender=FriendRequest)
+@receiver(post_delete, sender=FriendRequest)
+def refresh_friendship(sender, instance, **kwargs):
+    """Accepting adds the friendship edges; rejecting, unfriending or blocking removes them"""
+    sync_friendship(instance.sender_id, instance.receiver_id)
+
+@receiver(post_save, sender=FriendRequest)
+def update_suggestions_on_request(sender, instance, **kwargs):
+    """A pending or answered request takes the pair out of each other's suggestions"""
+    drop_suggestions(instance.sender_id, instance.receiver_id)
+    if instance.status == 'accepted':
+        # The new friendship changes both users' friends-of-friends
+        refresh_suggestions([instance.sender_id, instance.receiver_id])
+
+@receiver(post_delete, sender=FriendRequest)
+def update_suggestions_on_unfriend(sender, instance, **kwargs):
+    refresh_suggestions([instance.sender_id, instance.receiver_id])
+
+@receiver(post_save, sender=UserBlock)
+def drop_blocked_suggestions(sender, instance, **kwargs):
+    drop_suggestions(instance.blocker_id, instance.blocked_user_id)
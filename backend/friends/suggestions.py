@@ -0,0 +1,79 @@
+# friends/suggestions.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+from users.background import retry_on_lock
+from users.blocks import exclude_blocked
+from users.models import UserBlock
+from .models import FriendRequest, FriendSuggestion, Friendship
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 50
+
+# Jobs are held in memory only; compute_friend_suggestions rebuilds anything lost on restart
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='friend-suggestions')
+
+def suggestion_candidates(user_id):
+    """
+    Friends of the user's friends with their mutual-friend counts, best first.
+    Existing friends, anyone with a friend request either way and blocks either way are left out.
+    """
+    friend_ids = Friendship.objects.filter(user_id=user_id).values('friend_id')
+    return Friendship.objects.filter(
+        user_id__in=friend_ids
+    ).exclude(
+        friend_id=user_id
+    ).exclude(
+        friend_id__in=friend_ids
+    ).exclude(
+        friend_id__in=FriendRequest.objects.filter(sender_id=user_id).values('receiver_id')
+    ).exclude(
+        friend_id__in=FriendRequest.objects.filter(receiver_id=user_id).values('sender_id')
+    ).exclude(
+        friend_id__in=UserBlock.objects.filter(blocker_id=user_id).values('blocked_user_id')
+    ).exclude(
+        friend_id__in=UserBlock.objects.filter(blocked_user_id=user_id).values('blocker_id')
+    ).values('friend_id').annotate(
+        mutual_friends=Count('id')
+    ).order_by('-mutual_friends', 'friend_id')[:MAX_SUGGESTIONS]
+
+def compute_suggestions(user_id):
+    """Replace the user's stored suggestions with freshly computed ones"""
+    suggestions = [
+        FriendSuggestion(user_id=user_id, suggested_user_id=row['friend_id'], mutual_friends=row['mutual_friends'])
+        for row in suggestion_candidates(user_id)
+    ]
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id=user_id).delete()
+        FriendSuggestion.objects.bulk_create(suggestions)
+    return len(suggestions)
+
+def drop_suggestions(user_id, other_user_id):
+    """Remove the pair from each other's suggestions once they have a request, friendship or block"""
+    FriendSuggestion.objects.filter(
+        Q(user_id=user_id, suggested_user_id=other_user_id) | Q(user_id=other_user_id, suggested_user_id=user_id)
+    ).delete()
+
+def get_suggestions(user, limit=20):
+    """Stored suggestions for the user, read from the (user, mutual_friends) index"""
+    return exclude_blocked(
+        FriendSuggestion.objects.filter(user=user), user, 'suggested_user_id'
+    ).select_related('suggested_user').order_by('-mutual_friends', 'suggested_user_id')[:limit]
+
+def _run_refresh(user_ids):
+    for user_id in user_ids:
+        try:
+            retry_on_lock(compute_suggestions, user_id)
+        except Exception as e:
+            logger.error(f"Error computing friend suggestions for user {user_id}: {e}")
+    close_old_connections()
+
+def refresh_suggestions(user_ids):
+    """
+    Recompute suggestions for the given users on a background worker after the transaction commits.
+    Friends of these users are brought up to date by compute_friend_suggestions.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    transaction.on_commit(lambda: _executor.submit(_run_refresh, user_ids))
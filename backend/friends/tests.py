@@ -1,3 +1,204 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import OperationalError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from messaging.models import Conversation
+from users.models import CustomUser, UserBlock
+from .friendships import are_friends, friends_of, friendship_statuses
+from .models import FriendRequest, FriendSuggestion, Friendship, Notification
+from .notifications import coalesce_key, deliver_notifications
+from .suggestions import compute_suggestions, get_suggestions
 
-# Create your tests here.
+
+class FriendshipTests(TestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+        self.carol = CustomUser.objects.create_user(
+            username='carol', password='pw', email='carol@example.com', phone_number='300'
+        )
+
+    def test_accepting_creates_symmetric_edges(self):
+        friend_request = FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+        self.assertFalse(Friendship.objects.exists())
+
+        friend_request.status = 'accepted'
+        friend_request.save()
+        self.assertTrue(are_friends(self.alice, self.bob.id))
+        self.assertTrue(are_friends(self.bob, self.alice.id))
+        self.assertEqual(list(friends_of(self.bob)), [self.alice])
+
+    def test_removing_the_request_removes_edges(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='accepted')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.carol, status='accepted')
+
+        FriendRequest.objects.filter(sender=self.alice, receiver=self.bob).delete()
+        self.assertFalse(are_friends(self.alice, self.bob.id))
+        self.assertFalse(are_friends(self.bob, self.alice.id))
+        self.assertTrue(are_friends(self.carol, self.alice.id))
+
+    def test_block_removes_friendship(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='accepted')
+        self.client.force_login(self.alice)
+
+        self.client.post(reverse('block_user', args=[self.bob.id]), {'reason': 'spam'})
+        self.assertTrue(UserBlock.objects.filter(blocker=self.alice, blocked_user=self.bob).exists())
+        self.assertFalse(Friendship.objects.filter(user__in=[self.alice, self.bob]).exists())
+
+    def test_statuses_resolve_in_one_query(self):
+        dave = CustomUser.objects.create_user(
+            username='dave', password='pw', email='dave@example.com', phone_number='400'
+        )
+        FriendRequest.objects.create(sender=self.bob, receiver=self.alice, status='accepted')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.carol)
+        incoming = FriendRequest.objects.create(sender=dave, receiver=self.alice)
+
+        with self.assertNumQueries(1):
+            statuses, received_request_ids = friendship_statuses(self.alice, [self.bob.id, self.carol.id, dave.id])
+        self.assertEqual(statuses, {self.bob.id: 'friend', self.carol.id: 'pending_sent', dave.id: 'pending_received'})
+        self.assertEqual(received_request_ids, {dave.id: incoming.id})
+
+    def test_search_is_paginated(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('search_users'), {'search_query': 'example.com'})
+        self.assertEqual(response.context['users'].paginator.count, 2)
+        self.assertEqual(response.context['user_statuses'], {self.bob.id: 'not_friend', self.carol.id: 'not_friend'})
+
+
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(
+                username=name, password='pw', email=f'{name}@example.com', phone_number=str(100 + i)
+            )
+            for i, name in enumerate(['alice', 'bob', 'carol', 'dave', 'erin'])
+        ]
+        alice, bob, carol, dave, erin = self.users
+        # dave shares two friends with alice, erin shares one
+        for sender, receiver in [(alice, bob), (alice, carol), (bob, dave), (carol, dave), (carol, erin)]:
+            FriendRequest.objects.create(sender=sender, receiver=receiver, status='accepted')
+
+    def test_ranked_by_mutual_friends(self):
+        alice, bob, carol, dave, erin = self.users
+        compute_suggestions(alice.id)
+
+        with self.assertNumQueries(2):
+            suggestions = [(s.suggested_user, s.mutual_friends) for s in get_suggestions(alice)]
+        self.assertEqual(suggestions, [(dave, 2), (erin, 1)])
+
+        self.client.force_login(alice)
+        self.assertContains(self.client.get(reverse('friend_suggestions')), '2 mutual friends')
+
+    def test_requests_and_blocks_remove_suggestions(self):
+        alice, bob, carol, dave, erin = self.users
+        compute_suggestions(alice.id)
+
+        FriendRequest.objects.create(sender=dave, receiver=alice)
+        UserBlock.objects.create(blocker=erin, blocked_user=alice)
+        self.assertFalse(FriendSuggestion.objects.filter(user=alice).exists())
+
+        self.assertEqual(compute_suggestions(alice.id), 0)
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+        self.carol = CustomUser.objects.create_user(
+            username='carol', password='pw', email='carol@example.com', phone_number='300'
+        )
+        self.conversation = Conversation.objects.create(conversation_type='group', name='Team')
+
+    def message_from(self, sender, conversation=None):
+        return deliver_notifications(
+            [self.alice.id], 'message', f"New message from {sender.username}",
+            related_user_id=sender.id, conversation_id=(conversation or self.conversation).id, coalesce=True
+        )
+
+    def test_unread_notifications_count_up(self):
+        self.assertEqual(self.message_from(self.bob), (1, 0))
+        first = Notification.objects.get(user=self.alice)
+
+        self.assertEqual(self.message_from(self.carol), (0, 1))
+        self.assertEqual(self.message_from(self.bob), (0, 1))
+        notification = Notification.objects.get(user=self.alice)
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(notification.content, 'New message from bob')
+        self.assertGreater(notification.last_at, first.last_at)
+
+    def test_row_created_by_a_concurrent_job_is_coalesced(self):
+        self.message_from(self.carol)
+        lookups = []
+
+        # The first lookup misses the row, as if another job inserted it just after
+        def miss_first_lookup(related_user_id=None, conversation_id=None):
+            lookups.append(conversation_id)
+            if len(lookups) == 1:
+                return {'related_user_id': None, 'conversation_id': None}
+            return coalesce_key(related_user_id, conversation_id)
+
+        with mock.patch('friends.notifications.coalesce_key', side_effect=miss_first_lookup):
+            self.assertEqual(self.message_from(self.bob), (0, 1))
+        self.assertEqual(len(lookups), 2)
+        notification = Notification.objects.get(user=self.alice)
+        self.assertEqual((notification.count, notification.content), (2, 'New message from bob'))
+
+    def test_locked_database_is_retried(self):
+        bulk_create = Notification.objects.bulk_create
+        calls = []
+
+        def locked_once(objs, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=locked_once), \
+                mock.patch('users.background.time.sleep'):
+            self.assertEqual(self.message_from(self.bob), (1, 0))
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(Notification.objects.get(user=self.alice).count, 1)
+
+    def test_read_notification_starts_a_new_count(self):
+        self.message_from(self.bob)
+        self.message_from(self.bob)
+        Notification.objects.update(is_read=True)
+
+        # Once read, the next message reopens the conversation's row with a fresh count
+        self.message_from(self.bob)
+        notification = Notification.objects.get(user=self.alice)
+        self.assertEqual((notification.count, notification.is_read), (1, False))
+
+    def test_other_conversations_and_uncoalesced_events_get_new_rows(self):
+        other = Conversation.objects.create(conversation_type='group', name='Other')
+        self.message_from(self.bob)
+        self.message_from(self.bob, other)
+        deliver_notifications([self.alice.id], 'group_invite', 'bob added you', related_user_id=self.bob.id)
+        deliver_notifications([self.alice.id], 'group_invite', 'bob added you', related_user_id=self.bob.id)
+        self.assertEqual(Notification.objects.filter(user=self.alice, notification_type='message').count(), 2)
+        self.assertEqual(Notification.objects.filter(user=self.alice, notification_type='group_invite').count(), 2)
+
+    def test_purge_deletes_only_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=31)
+        recent = timezone.now() - timedelta(days=5)
+        kept = [
+            Notification.objects.create(user=self.alice, notification_type='friend_request', content='old unread', last_at=old),
+            Notification.objects.create(user=self.alice, notification_type='friend_request', content='recent read', is_read=True, last_at=recent),
+        ]
+        Notification.objects.create(user=self.alice, notification_type='friend_request', content='old read', is_read=True, last_at=old)
+        Notification.objects.create(user=self.bob, notification_type='friend_request', content='old read', is_read=True, last_at=old)
+
+        call_command('purge_notifications', '--days', '30', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(list(Notification.objects.order_by('id')), kept)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('accept-request/<int:request_id>/', views.accept_friend_request, name='accept_friend_request'),
     path('reject-request/<int:request_id>/', views.reject_friend_request, name='reject_friend_request'),
     path('list/', views.friend_list, name='friend_list'),
+    path('suggestions/', views.friend_suggestions, name='friend_suggestions'),
     path('notifications/', views.notifications, name='notifications'),
     path('mark-notification-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
 ]
\ No newline at end of file
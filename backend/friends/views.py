@@ -1,12 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.http import JsonResponse
 from users.models import CustomUser
 from .models import FriendRequest, Notification
 from .forms import UserSearchForm
-from users.models import UserBlock
+from .friendships import friends_of, friendship_statuses
+from .suggestions import get_suggestions
+from users.blocks import exclude_blocked, is_blocked_between
+from users.search import find_users
+
+NOTIFICATIONS_PER_PAGE = 20
+SEARCH_RESULTS_PER_PAGE = 20
+# Broad queries stop here; users refine the search instead of paging further
+MAX_SEARCH_RESULTS = 200
 
 @login_required
 def search_users(request):
@@ -16,51 +24,28 @@ def search_users(request):
     if form.is_valid():
         search_query = form.cleaned_data.get('search_query')
         if search_query:
-            # Get users matching query but exclude blocked users
-            blocked_by_me = UserBlock.objects.filter(blocker=request.user).values_list('blocked_user', flat=True)
-            blocking_me = UserBlock.objects.filter(blocked_user=request.user).values_list('blocker', flat=True)
-            users = CustomUser.objects.filter(
-                Q(username__icontains=search_query) | 
-                Q(email__icontains=search_query)
-            ).exclude(
+            # Get users matching query but exclude blocked users, best matches first
+            matches = exclude_blocked(find_users(search_query).exclude(
                 id=request.user.id
-            ).exclude(
-                id__in=blocked_by_me
-            ).exclude(
-                id__in=blocking_me
-            )
-    
-    # Get the friendship status for each user
-    user_statuses = {}
-    for user in users:
-        sent_request = FriendRequest.objects.filter(sender=request.user, receiver=user).first()
-        received_request = FriendRequest.objects.filter(sender=user, receiver=request.user).first()
-        
-        if sent_request and sent_request.status == 'accepted':
-            status = 'friend'
-        elif sent_request and sent_request.status == 'pending':
-            status = 'pending_sent'
-        elif received_request and received_request.status == 'pending':
-            status = 'pending_received'
-        else:
-            status = 'not_friend'
-            
-        user_statuses[user.id] = status
+            ), request.user)
+            users = Paginator(matches[:MAX_SEARCH_RESULTS], SEARCH_RESULTS_PER_PAGE).get_page(request.GET.get('page'))
+    
+    # Get the friendship status for the users on this page
+    user_statuses, received_request_ids = friendship_statuses(request.user, [user.id for user in users])
     
     return render(request, 'friends/search_users.html', {
         'form': form,
         'users': users,
-        'user_statuses': user_statuses
+        'user_statuses': user_statuses,
+        'received_request_ids': received_request_ids,
+        'max_results': MAX_SEARCH_RESULTS
     })
 
 @login_required
 def send_friend_request(request, user_id):
     receiver = get_object_or_404(CustomUser, id=user_id)
 
-    if UserBlock.objects.filter(
-        (Q(blocker=request.user) & Q(blocked_user=receiver)) |
-        (Q(blocker=receiver) & Q(blocked_user=request.user))
-    ).exists():
+    if is_blocked_between(request.user, receiver.id):
         messages.error(request, "You cannot send a friend request to this user.")
         return redirect('search_users')
     
@@ -133,24 +118,23 @@ def reject_friend_request(request, request_id):
 
 @login_required
 def friend_list(request):
-    # Get users who have accepted friend requests with the current user
-    friends_1 = FriendRequest.objects.filter(
-        sender=request.user,
-        status='accepted'
-    ).values_list('receiver', flat=True)
-    
-    friends_2 = FriendRequest.objects.filter(
-        receiver=request.user,
-        status='accepted'
-    ).values_list('sender', flat=True)
-    
-    friends = CustomUser.objects.filter(Q(id__in=friends_1) | Q(id__in=friends_2))
+    friends = friends_of(request.user)
     
     return render(request, 'friends/friend_list.html', {'friends': friends})
 
+@login_required
+def friend_suggestions(request):
+    # Precomputed by mutual friends, so this is a single indexed read
+    suggestions = get_suggestions(request.user)
+    
+    return render(request, 'friends/suggestions.html', {'suggestions': suggestions})
+
 @login_required
 def notifications(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
+    notifications = Paginator(
+        Notification.objects.filter(user=request.user).order_by('-last_at'),
+        NOTIFICATIONS_PER_PAGE
+    ).get_page(request.GET.get('page'))
     
     # Get friend requests from notifications
     friend_requests = FriendRequest.objects.filter(
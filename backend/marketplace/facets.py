@@ -0,0 +1,67 @@
+# marketplace/facets.py
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+# Upper bounds of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKET_LIMITS = [Decimal(limit) for limit in ('25', '50', '100', '250', '500', '1000')]
+
+FACET_CACHE_KEY = 'marketplace_facets'
+FACET_CACHE_TTL = 600
+
+def price_buckets():
+    """(min_price, max_price) pairs; max_price is None for the last bucket"""
+    lower = Decimal('0')
+    buckets = []
+    for limit in PRICE_BUCKET_LIMITS:
+        buckets.append((lower, limit))
+        lower = limit
+    buckets.append((lower, None))
+    return buckets
+
+def _price_q(min_price=None, max_price=None):
+    q = Q()
+    if min_price is not None:
+        q &= Q(price__gte=min_price)
+    if max_price is not None:
+        q &= Q(price__lte=max_price)
+    return q
+
+def compute_facets(items, categories, category=None, min_price=None, max_price=None):
+    """
+    Item counts per category and per price bucket, from one aggregate query.
+    items carries every filter except category and price: category counts respect the price filter
+    and bucket counts respect the category filter, so each facet shows where the other choices lead.
+    """
+    category_q = Q(category_id=category) if category else Q()
+    price_q = _price_q(min_price, max_price)
+
+    aggregates = {
+        f"category_{c.id}": Count('id', filter=Q(category_id=c.id) & price_q)
+        for c in categories
+    }
+    buckets = price_buckets()
+    for index, (low, high) in enumerate(buckets):
+        # Bucket ranges are half-open so an item falls in exactly one
+        bucket_q = Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q())
+        aggregates[f"bucket_{index}"] = Count('id', filter=bucket_q & category_q)
+    counts = items.order_by().aggregate(**aggregates)
+
+    return {
+        'categories': [(c, counts[f"category_{c.id}"]) for c in categories],
+        'price_buckets': [(low, high, counts[f"bucket_{index}"]) for index, (low, high) in enumerate(buckets)],
+    }
+
+def get_facets(items, categories, filtered, **filters):
+    """Facets for the listing; the unfiltered case is cached until listings or categories change"""
+    if filtered:
+        return compute_facets(items, categories, **filters)
+
+    facets = cache.get(FACET_CACHE_KEY)
+    if facets is None:
+        facets = compute_facets(items, categories)
+        cache.set(FACET_CACHE_KEY, facets, FACET_CACHE_TTL)
+    return facets
+
+def invalidate_facets():
+    cache.delete(FACET_CACHE_KEY)
@@ -36,6 +36,16 @@ class ItemSearchForm(forms.Form):
         min_value=0,
         widget=forms.NumberInput(attrs={'placeholder': 'Max Price', 'class': 'form-control'})
     )
+    sort = forms.ChoiceField(
+        choices=[
+            ('', 'Best match / Newest'),
+            ('newest', 'Newest'),
+            ('price_asc', 'Price: Low to High'),
+            ('price_desc', 'Price: High to Low'),
+        ],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
     
     def __init__(self, *args, **kwargs):
         from .models import Category
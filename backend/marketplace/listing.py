@@ -0,0 +1,82 @@
+# marketplace/listing.py
+import base64
+import json
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+ITEMS_PER_PAGE = 24
+
+# Each ordering ends in the primary key so every position is unique.
+# newest and the price orders are served by the (status, created_at, id) and (status, price, id) indexes.
+SORT_ORDERS = {
+    'relevance': ('-search_score', '-created_at', '-id'),
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+}
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, size):
+    """Return the cursor's values, or None if it is missing or malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, int):
+        return value
+    return str(value)
+
+def _field_value(model, name, raw):
+    if name == 'search_score':
+        return int(raw)
+    return model._meta.get_field(name).to_python(raw)
+
+def _after(model, ordering, values):
+    """Q matching rows that come after the cursor position in this ordering"""
+    condition = Q()
+    equal = {}
+    for field, raw in zip(ordering, values):
+        name = field.lstrip('-')
+        value = _field_value(model, name, raw)
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+
+    # Also bound the leading column on its own, so the scan starts at the cursor in the index
+    first = ordering[0]
+    first_lookup = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f"{first.lstrip('-')}__{first_lookup}": equal[first.lstrip('-')]}) & condition
+
+def keyset_page(queryset, sort, cursor=None, per_page=ITEMS_PER_PAGE):
+    """
+    Return (items, next_cursor) for one page of the queryset in the given sort order.
+    Pages are found by position rather than offset, so deep pages cost the same as the first.
+    """
+    ordering = SORT_ORDERS[sort]
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(cursor, len(ordering)) if cursor else None
+    if values is not None:
+        try:
+            queryset = queryset.filter(_after(queryset.model, ordering, values))
+        except (ValidationError, ValueError, TypeError):
+            # A tampered cursor starts from the first page
+            pass
+
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor([_cursor_value(getattr(last, field.lstrip('-'))) for field in ordering])
+    return items, next_cursor
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from marketplace.models import Item
+from marketplace.media import process_item_image
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails and detail-page sizes for listing images that have not been processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess every listing image')
+
+    def handle(self, *args, **options):
+        items = Item.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            items = items.filter(image_processed_at__isnull=True)
+
+        item_ids = list(items.values_list('id', flat=True))
+        self.stdout.write(f"Found {len(item_ids)} listing images to process")
+
+        count = 0
+        for item_id in item_ids:
+            if not process_item_image(item_id):
+                continue
+            count += 1
+
+            if count % 10 == 0:
+                self.stdout.write(f"Processed {count}/{len(item_ids)} images...")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {count} listing images"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from marketplace.models import Item
+from marketplace.search import index_item
+
+class Command(BaseCommand):
+    help = 'Rebuild the marketplace listing search index (e.g. after changing how terms are weighted)'
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for item in Item.objects.only('id', 'name', 'description').iterator(chunk_size=1000):
+            index_item(item)
+            indexed += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} listings"))
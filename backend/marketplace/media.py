@@ -0,0 +1,81 @@
+# marketplace/media.py
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from messaging.media import delete_variant_files, generate_image_variants, generate_thumbnails
+from users.background import retry_on_lock
+from users.media_access import index_media_paths
+
+logger = logging.getLogger(__name__)
+
+# Listing cards are 200px tall; the larger size covers high-density screens
+THUMBNAIL_SIZES = ((400, 300), (800, 600))
+GRID_THUMBNAIL_WIDTH = 400
+DETAIL_IMAGE_WIDTHS = (640, 1280)
+DETAIL_IMAGE_WIDTH = 1280
+
+# Jobs are held in memory only; anything lost on restart is picked up by process_item_images
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='item-media')
+
+def variant_paths(image_variants):
+    """Every generated file recorded in an item's image_variants"""
+    return [
+        path
+        for key in ('thumbnail', 'detail')
+        for by_width in (image_variants or {}).get(key, {}).values()
+        for path in by_width.values()
+    ]
+
+def process_item_image(item_id):
+    """Generate the listing thumbnails and detail-page sizes for an item's image and record them"""
+    from .models import Item
+
+    item = Item.objects.filter(pk=item_id).first()
+    if not item:
+        return None
+
+    variants = {}
+    if item.image:
+        name_prefix = f"marketplace/variants/{item.id}/{os.path.splitext(os.path.basename(item.image.name))[0]}"
+        try:
+            with item.image.open('rb') as image_file:
+                thumbnails = generate_thumbnails(image_file, f"{name_prefix}_thumb", THUMBNAIL_SIZES)
+                image_file.seek(0)
+                detail = generate_image_variants(image_file, name_prefix, DETAIL_IMAGE_WIDTHS)
+            variants = {'source': item.image.name, 'thumbnail': thumbnails, 'detail': detail}
+        except Exception as e:
+            logger.error(f"Error processing image for item {item.id}: {e}")
+            variants = {'source': item.image.name}
+
+    new_paths = variant_paths(variants)
+    index_media_paths(new_paths, 'marketplace', item.seller_id)
+
+    # Only record the variants if the image was not replaced while they were generated
+    current_image = Q(image=item.image.name) if item.image else Q(image='') | Q(image__isnull=True)
+    updated = Item.objects.filter(current_image, pk=item.pk).update(
+        image_variants=variants,
+        image_processed_at=timezone.now()
+    )
+    if not updated:
+        delete_variant_files(new_paths)
+        return None
+
+    stale = set(variant_paths(item.image_variants)) - set(new_paths)
+    if stale:
+        delete_variant_files(list(stale))
+    return variants
+
+def _process_in_background(item_id):
+    try:
+        retry_on_lock(process_item_image, item_id)
+    except Exception as e:
+        logger.error(f"Error processing image for item {item_id}: {e}")
+    finally:
+        close_old_connections()
+
+def schedule_item_image_processing(item_id):
+    """Process the item's image on a background worker once the current transaction commits"""
+    transaction.on_commit(lambda: _executor.submit(_process_in_background, item_id))
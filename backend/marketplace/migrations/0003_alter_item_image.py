@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:56
+
+from django.db import migrations, models
+import users.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_alter_payment_payment_method'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=users.storage.ContentAddressedStorage(), upload_to='marketplace/'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    """Index existing listings; later changes are indexed by the post_save signal"""
+    from marketplace.search import item_terms
+
+    Item = apps.get_model('marketplace', 'Item')
+    ItemSearchTerm = apps.get_model('marketplace', 'ItemSearchTerm')
+    rows = []
+    for item_id, name, description in Item.objects.values_list('id', 'name', 'description').iterator():
+        rows.extend(
+            ItemSearchTerm(item_id=item_id, term=term, weight=weight)
+            for term, weight in item_terms(name, description).items()
+        )
+        if len(rows) >= 5000:
+            ItemSearchTerm.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    ItemSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0003_alter_item_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='marketplace.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'item'], name='marketplace_term_08e979_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='itemsearchterm',
+            constraint=models.UniqueConstraint(fields=('item', 'term'), name='unique_item_search_term'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_itemsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='marketplace_status_c33235_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['status', 'price', 'id'], name='marketplace_status_04aca9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['status', 'category', 'price', 'id'], name='marketplace_status_8ef751_idx'),
+        ),
+    ]
@@ -1,6 +1,13 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import F, Sum
 from django.conf import settings
+from django.utils.functional import cached_property
 from users.models import CustomUser
+from django.core.files.storage import default_storage
+from users.storage import ContentAddressedStorage
+from messaging.media import pick_variant, variant_srcset
+from .media import DETAIL_IMAGE_WIDTH, GRID_THUMBNAIL_WIDTH
 import uuid
 
 class Category(models.Model):
@@ -28,26 +35,92 @@ class Item(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    image = models.ImageField(upload_to='marketplace/', blank=True, null=True)
+    image = models.ImageField(upload_to='marketplace/', storage=ContentAddressedStorage(), blank=True, null=True)
+    # {'source': image name, 'thumbnail': {format: {width: path}}, 'detail': {format: {width: path}}}
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_processed_at = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='available')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Listing pages filter on status and walk one of these in sort order; id breaks ties for keyset pagination
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id']),
+            models.Index(fields=['status', 'price', 'id']),
+            models.Index(fields=['status', 'category', 'price', 'id']),
+        ]
+    
     def __str__(self):
         return self.name
+    
+    def image_display_url(self, kind, width):
+        """URL of the smallest generated variant at least width wide, else the original image"""
+        if not self.image:
+            return None
+        path = pick_variant((self.image_variants or {}).get(kind, {}), width)
+        if path:
+            return default_storage.url(path)
+        return self.image.url
+    
+    @property
+    def thumbnail_url(self):
+        return self.image_display_url('thumbnail', GRID_THUMBNAIL_WIDTH)
+    
+    @property
+    def thumbnail_srcset(self):
+        return variant_srcset((self.image_variants or {}).get('thumbnail', {}))
+    
+    @property
+    def detail_image_url(self):
+        return self.image_display_url('detail', DETAIL_IMAGE_WIDTH)
+    
+    @property
+    def detail_image_srcset(self):
+        return variant_srcset((self.image_variants or {}).get('detail', {}))
+
+class ItemSearchTerm(models.Model):
+    """A word from an item's name or description, weighted for ranking; the search index for listings"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=32)
+    weight = models.PositiveSmallIntegerField(default=1)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'term'], name='unique_item_search_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'item']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.item_id}"
 
 class Cart(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @cached_property
+    def totals(self):
+        """Total price and item count from one aggregate query, kept for the life of this instance"""
+        totals = self.items.aggregate(
+            total_price=Sum(F('quantity') * F('item__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            total_items=Sum('quantity')
+        )
+        # SQLite multiplies decimals as floats; round back to cents
+        return {
+            'total_price': (totals['total_price'] or Decimal('0')).quantize(Decimal('0.01')),
+            'total_items': totals['total_items'] or 0,
+        }
+    
     @property
     def total_price(self):
-        return sum(item.item.price * item.quantity for item in self.items.all())
+        return self.totals['total_price']
     
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.totals['total_items']
     
     def __str__(self):
         return f"Cart for {self.user.username}"
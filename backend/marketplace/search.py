@@ -0,0 +1,84 @@
+# marketplace/search.py
+from collections import Counter
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, When
+from users.search import tokenize
+from .models import ItemSearchTerm
+
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TERMS = 5
+
+NAME_WEIGHT = 5
+# Repeating a word in the description stops counting after this many times
+MAX_DESCRIPTION_WEIGHT = 3
+# Added when a query word matches a whole indexed word rather than a prefix of one
+WHOLE_WORD_BONUS = 2
+
+def item_terms(name, description):
+    """Map each word of the listing to its weight"""
+    terms = Counter()
+    for word in tokenize(name):
+        if len(word) >= MIN_TERM_LENGTH:
+            terms[word] += NAME_WEIGHT
+    description_words = Counter(word for word in tokenize(description) if len(word) >= MIN_TERM_LENGTH)
+    for word, count in description_words.items():
+        terms[word] += min(count, MAX_DESCRIPTION_WEIGHT)
+    return dict(terms)
+
+def index_item(item):
+    """Bring the item's search terms in line with its current name and description"""
+    terms = item_terms(item.name, item.description)
+    existing = dict(ItemSearchTerm.objects.filter(item=item).values_list('term', 'weight'))
+    if existing == terms:
+        return
+
+    stale = [term for term, weight in existing.items() if terms.get(term) != weight]
+    if stale:
+        ItemSearchTerm.objects.filter(item=item, term__in=stale).delete()
+    ItemSearchTerm.objects.bulk_create([
+        ItemSearchTerm(item=item, term=term, weight=weight)
+        for term, weight in terms.items()
+        if existing.get(term) != weight
+    ], batch_size=500)
+
+def _terms_starting_with(word):
+    # A range rather than LIKE, so the (term, item) index is used
+    return ItemSearchTerm.objects.filter(term__gte=word, term__lt=word + '\uffff')
+
+def _query_words(query):
+    return list(dict.fromkeys(word for word in tokenize(query) if len(word) >= MIN_TERM_LENGTH))[:MAX_QUERY_TERMS]
+
+def match_items(items, query):
+    """Narrow an Item queryset to listings with a word starting with every query word"""
+    words = _query_words(query)
+    if not words:
+        return items.none()
+    for word in words:
+        items = items.filter(pk__in=_terms_starting_with(word).values('item_id'))
+    return items
+
+def score_items(items, query):
+    """Annotate listings already narrowed by match_items with search_score and order them best first"""
+    words = _query_words(query)
+    if not words:
+        return items
+
+    score = None
+    for word in words:
+        matching = _terms_starting_with(word)
+        word_score = Subquery(
+            matching.filter(item_id=OuterRef('pk')).annotate(
+                score=Case(
+                    When(term=word, then=F('weight') + WHOLE_WORD_BONUS),
+                    default=F('weight'),
+                    output_field=IntegerField()
+                )
+            ).order_by('-score').values('score')[:1],
+            output_field=IntegerField()
+        )
+        score = word_score if score is None else score + word_score
+
+    return items.annotate(search_score=score).order_by('-search_score', '-created_at')
+
+def search_items(items, query):
+    """Listings matching every query word, best first"""
+    return score_items(match_items(items, query), query)
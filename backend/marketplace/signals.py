@@ -0,0 +1,61 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.media_access import index_field_file
+from users.counters import invalidate_cart_count
+from users.storage import release_blob
+from .facets import invalidate_facets
+from .media import delete_variant_files, schedule_item_image_processing, variant_paths
+from .models import Item, Category, Cart, CartItem
+from .search import index_item
+
+@receiver(post_save, sender=Item)
+def index_item_media(sender, instance, update_fields=None, **kwargs):
+    """Register listing images for protected media access checks"""
+    index_field_file(instance, 'image', 'marketplace', instance.seller_id, update_fields=update_fields)
+
+@receiver(post_save, sender=Item)
+def index_item_search(sender, instance, update_fields=None, **kwargs):
+    """Keep the listing search index in step with name and description changes"""
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    index_item(instance)
+
+@receiver(post_save, sender=Item)
+def refresh_facets_on_save(sender, instance, update_fields=None, **kwargs):
+    """Cached sidebar counts change when a listing's status, category or price does"""
+    if update_fields is not None and not {'status', 'category', 'price'} & set(update_fields):
+        return
+    invalidate_facets()
+
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_facets(sender, instance, **kwargs):
+    invalidate_facets()
+
+@receiver(post_save, sender=Item)
+def process_item_image_variants(sender, instance, update_fields=None, **kwargs):
+    """Generate thumbnails off the request path whenever the listing image changes"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    source = instance.image.name if instance.image else None
+    if (instance.image_variants or {}).get('source') != source:
+        schedule_item_image_processing(instance.pk)
+
+@receiver(post_delete, sender=Item)
+def release_item_media(sender, instance, **kwargs):
+    if instance.image:
+        release_blob(instance.image.name)
+    delete_variant_files(variant_paths(instance.image_variants))
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def refresh_cart_count(sender, instance, **kwargs):
+    """Drop the cached cart item count when the cart contents change"""
+    user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    if user_id:
+        invalidate_cart_count(user_id)
+
+@receiver(post_delete, sender=Cart)
+def refresh_deleted_cart_count(sender, instance, **kwargs):
+    invalidate_cart_count(instance.user_id)
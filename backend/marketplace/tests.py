@@ -1,3 +1,197 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from django.urls import reverse
+from users.models import CustomUser, UserBlock
+from .facets import compute_facets, get_facets
+from .listing import keyset_page
+from .media import process_item_image
+from .models import Cart, CartItem, Category, Item
+from .search import search_items
 
-# Create your tests here.
+
+class ItemSearchTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(
+            username='seller', password='pw', email='seller@example.com', phone_number='100'
+        )
+        self.furniture = Category.objects.create(name='Furniture')
+        self.lamp = Item.objects.create(
+            seller=self.seller, category=self.furniture, name='Desk lamp', description='Brass lamp with a green shade', price=40
+        )
+        self.table = Item.objects.create(
+            seller=self.seller, category=self.furniture, name='Oak table', description='Comes with a matching lamp', price=250
+        )
+        self.lampshade = Item.objects.create(
+            seller=self.seller, name='Lampshade', description='Linen, fits most lamps', price=15
+        )
+
+    def search(self, query, items=None):
+        return list(search_items(items if items is not None else Item.objects.all(), query))
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search('lamp'), [self.lamp, self.lampshade, self.table])
+        self.assertEqual(self.search('brass la'), [self.lamp])
+        self.assertEqual(self.search('chair'), [])
+
+    def test_combined_with_filters(self):
+        items = Item.objects.filter(category=self.furniture, price__gte=100)
+        self.assertEqual(self.search('lamp', items), [self.table])
+
+    def test_edits_reindex(self):
+        self.table.name = 'Walnut table'
+        self.table.save()
+        self.assertEqual(self.search('oak'), [])
+        self.assertEqual(self.search('walnut'), [self.table])
+
+
+class ListingPaginationTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(
+            username='seller', password='pw', email='seller@example.com', phone_number='100'
+        )
+        # Repeated prices check that ties are broken by id without skipping or repeating items
+        self.items = [
+            Item.objects.create(seller=self.seller, name=f'Item {i}', description='Listing', price=10 + i % 3)
+            for i in range(7)
+        ]
+
+    def walk(self, sort, per_page=3):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Item.objects.all(), sort, cursor, per_page=per_page)
+            seen.extend(page)
+            if not cursor:
+                return seen
+
+    def test_pages_cover_every_item_once_in_order(self):
+        by_price = sorted(self.items, key=lambda item: (item.price, item.id))
+        self.assertEqual(self.walk('price_asc'), by_price)
+        self.assertEqual(self.walk('price_desc'), by_price[::-1])
+        self.assertEqual(self.walk('newest'), sorted(self.items, key=lambda item: (item.created_at, item.id), reverse=True))
+
+    def test_bad_cursor_starts_over(self):
+        first_page, _ = keyset_page(Item.objects.all(), 'newest', per_page=3)
+        self.assertEqual(keyset_page(Item.objects.all(), 'newest', 'not-a-cursor', per_page=3)[0], first_page)
+
+    def test_home_page_excludes_blocked_sellers(self):
+        buyer = CustomUser.objects.create_user(
+            username='buyer', password='pw', email='buyer@example.com', phone_number='200', is_verified=True
+        )
+        self.client.force_login(buyer)
+        response = self.client.get(reverse('marketplace_home'), {'sort': 'price_asc'})
+        self.assertEqual(len(response.context['items']), 7)
+        response = self.client.get(reverse('marketplace_home'), {'search_query': 'item', 'max_price': '11'})
+        self.assertEqual(len(response.context['items']), 5)
+
+        UserBlock.objects.create(blocker=self.seller, blocked_user=buyer)
+        response = self.client.get(reverse('marketplace_home'))
+        self.assertEqual(response.context['items'], [])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = CustomUser.objects.create_user(
+            username='seller', password='pw', email='seller@example.com', phone_number='100'
+        )
+        self.books = Category.objects.create(name='Books')
+        self.toys = Category.objects.create(name='Toys')
+        for category, price in [(self.books, 10), (self.books, 60), (self.toys, 30), (self.toys, 2000)]:
+            Item.objects.create(seller=self.seller, category=category, name='Thing', description='Thing', price=price)
+
+    def counts(self, facets):
+        return (
+            [count for category, count in facets['categories']],
+            [count for low, high, count in facets['price_buckets']],
+        )
+
+    def test_counts_in_one_query(self):
+        categories = list(Category.objects.order_by('id'))
+        with self.assertNumQueries(1):
+            facets = compute_facets(Item.objects.all(), categories)
+        self.assertEqual(self.counts(facets), ([2, 2], [1, 1, 1, 0, 0, 0, 1]))
+
+    def test_each_facet_respects_the_other_filter(self):
+        categories = list(Category.objects.order_by('id'))
+        facets = compute_facets(Item.objects.all(), categories, category=self.books.id, max_price=50)
+        # Categories are counted within the price filter, buckets within the category
+        self.assertEqual(self.counts(facets), ([1, 1], [1, 0, 1, 0, 0, 0, 0]))
+
+    def test_unfiltered_facets_cached_until_items_change(self):
+        categories = Category.objects.order_by('id')
+        self.assertEqual(self.counts(get_facets(Item.objects.all(), categories, False))[0], [2, 2])
+        with self.assertNumQueries(0):
+            get_facets(Item.objects.all(), categories, False)
+
+        item = Item.objects.filter(category=self.toys).first()
+        item.status = 'sold'
+        item.save()
+        self.assertEqual(self.counts(get_facets(Item.objects.filter(status='available'), categories, False))[0], [2, 1])
+
+
+class ItemImageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.seller = CustomUser.objects.create_user(
+            username='seller', password='pw', email='seller@example.com', phone_number='100'
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, size=(2000, 1200), color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_thumbnails_generated_and_replaced(self):
+        item = Item.objects.create(seller=self.seller, name='Bike', description='Bike', price=100, image=self.upload())
+        self.assertEqual(item.thumbnail_url, item.image.url)
+
+        variants = process_item_image(item.pk)
+        item.refresh_from_db()
+        with Image.open(os.path.join(self.media_root, variants['thumbnail']['webp']['400'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 300))
+        self.assertEqual(sorted(variants['detail']['jpeg']), ['1280', '640'])
+        self.assertIn('_thumb_400', item.thumbnail_url)
+        self.assertIn('800w', item.thumbnail_srcset)
+
+        old_paths = [path for by_width in variants['thumbnail'].values() for path in by_width.values()]
+        item.image = self.upload(color='blue')
+        item.save()
+        process_item_image(item.pk)
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root, path)) for path in old_paths))
+
+
+class CartTotalTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(
+            username='seller', password='pw', email='seller@example.com', phone_number='100'
+        )
+        self.buyer = CustomUser.objects.create_user(
+            username='buyer', password='pw', email='buyer@example.com', phone_number='200'
+        )
+        self.cart = Cart.objects.create(user=self.buyer)
+
+    def test_totals_from_one_query(self):
+        for price, quantity in [('19.99', 2), ('5.50', 3), ('100.00', 1)]:
+            item = Item.objects.create(seller=self.seller, name='Thing', description='Thing', price=price)
+            CartItem.objects.create(cart=self.cart, item=item, quantity=quantity)
+
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(cart.total_price), '156.48')
+            self.assertEqual(cart.total_items, 6)
+
+    def test_empty_cart(self):
+        self.assertEqual(str(self.cart.total_price), '0.00')
+        self.assertEqual(self.cart.total_items, 0)
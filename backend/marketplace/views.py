@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from django.http import JsonResponse
 from .models import Item, Category, Cart, CartItem, Order, OrderItem, Payment
 from .forms import ItemForm, ItemSearchForm, CheckoutForm, PaymentForm
-from users.models import UserBlock
+from .listing import keyset_page
+from .facets import get_facets
+from .search import match_items, score_items
+from users.blocks import blocked_user_ids, exclude_blocked, is_blocked_between
 
 @login_required
 def marketplace_home(request):
@@ -16,46 +18,57 @@ def marketplace_home(request):
     
     form = ItemSearchForm(request.GET)
 
-    # Get users who have blocked me or who I've blocked
-    blocked_by_me = UserBlock.objects.filter(blocker=request.user).values_list('blocked_user', flat=True)
-    blocking_me = UserBlock.objects.filter(blocked_user=request.user).values_list('blocker', flat=True)
-    blocked_users = list(blocked_by_me) + list(blocking_me)
-    
-    # Base queryset of available items, excluding blocked users' items
-    items = Item.objects.filter(status='available').exclude(seller__in=blocked_users)
-    
-    # Base queryset of available items
-    items = Item.objects.filter(status='available')
+    # Base queryset of available items, excluding items from users blocked in either direction
+    items = exclude_blocked(Item.objects.filter(status='available'), request.user, 'seller_id').select_related('seller')
+    sort = 'newest'
+    search_query = None
+    filters = {}
     
     # Apply filters if form is valid
     if form.is_valid():
         search_query = form.cleaned_data.get('search_query')
-        category = form.cleaned_data.get('category')
-        min_price = form.cleaned_data.get('min_price')
-        max_price = form.cleaned_data.get('max_price')
-        
-        if search_query:
-            items = items.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-        
-        if category:
-            items = items.filter(category_id=category)
-        
-        if min_price is not None:
-            items = items.filter(price__gte=min_price)
-        
-        if max_price is not None:
-            items = items.filter(price__lte=max_price)
+        filters = {
+            'category': form.cleaned_data.get('category'),
+            'min_price': form.cleaned_data.get('min_price'),
+            'max_price': form.cleaned_data.get('max_price'),
+        }
+        sort = form.cleaned_data.get('sort') or ('relevance' if search_query else sort)
+    
+    if search_query:
+        items = match_items(items, search_query)
     
-    # Get categories for the sidebar
+    # Sidebar counts per category and price range for the current search
     categories = Category.objects.all()
+    filtered = bool(search_query or any(value not in (None, '') for value in filters.values()) or blocked_user_ids(request.user))
+    facets = get_facets(items, categories, filtered, **filters)
+    
+    if filters.get('category'):
+        items = items.filter(category_id=filters['category'])
+    
+    if filters.get('min_price') is not None:
+        items = items.filter(price__gte=filters['min_price'])
+    
+    if filters.get('max_price') is not None:
+        items = items.filter(price__lte=filters['max_price'])
+    
+    # Rank search results unless another order was chosen
+    if search_query and sort == 'relevance':
+        items = score_items(items, search_query)
+    
+    # One page at a time, continuing after the last item of the previous page
+    items, next_cursor = keyset_page(items, sort, request.GET.get('after'))
+    
+    # Filters to carry over to the next page
+    page_params = request.GET.copy()
+    page_params.pop('after', None)
     
     return render(request, 'marketplace/home.html', {
         'items': items,
-        'categories': categories,
-        'form': form
+        'facets': facets,
+        'form': form,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+        'page_params': page_params.urlencode()
     })
 
 @login_required
@@ -68,10 +81,7 @@ def item_detail(request, item_id):
     item = get_object_or_404(Item, id=item_id)
 
     # Check for blocks
-    if UserBlock.objects.filter(
-        (Q(blocker=request.user) & Q(blocked_user=item.seller)) |
-        (Q(blocker=item.seller) & Q(blocked_user=request.user))
-    ).exists():
+    if is_blocked_between(request.user, item.seller_id):
         messages.error(request, "You cannot view this item due to a user block.")
         return redirect('marketplace_home')
     return render(request, 'marketplace/item_detail.html', {'item': item})
@@ -153,10 +163,7 @@ def add_to_cart(request, item_id):
     item = get_object_or_404(Item, id=item_id, status='available')
 
     # Check for blocks
-    if UserBlock.objects.filter(
-        (Q(blocker=request.user) & Q(blocked_user=item.seller)) |
-        (Q(blocker=item.seller) & Q(blocked_user=request.user))
-    ).exists():
+    if is_blocked_between(request.user, item.seller_id):
         messages.error(request, "You cannot purchase items from this seller.")
         return redirect('marketplace_home')
     
@@ -261,7 +268,7 @@ def checkout(request):
     cart = get_object_or_404(Cart, user=request.user)
     
     # Check if cart is empty
-    if cart.items.count() == 0:
+    if not cart.total_items:
         messages.warning(request, "Your cart is empty.")
         return redirect('marketplace_home')
     
@@ -276,7 +283,7 @@ def checkout(request):
             order.save()
             
             # Create order items
-            for cart_item in cart.items.all():
+            for cart_item in cart.items.select_related('item__seller'):
                 OrderItem.objects.create(
                     order=order,
                     item_name=cart_item.item.name,
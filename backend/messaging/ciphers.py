@@ -0,0 +1,23 @@
+# messaging/ciphers.py
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet
+from django.conf import settings
+
+@lru_cache(maxsize=4)
+def _build_cipher(keys):
+    return MultiFernet([Fernet(key.encode()) for key in keys])
+
+def get_encryption_keys():
+    """Return the message encryption keys, newest (primary) first"""
+    return (settings.ENCRYPTION_KEY,) + tuple(getattr(settings, 'ENCRYPTION_OLD_KEYS', ()))
+
+def get_message_cipher():
+    """
+    Return the shared MultiFernet for message content.
+    Encrypts with the primary key and decrypts with any configured key.
+    """
+    return _build_cipher(get_encryption_keys())
+
+def get_primary_cipher():
+    """Return a cipher for the primary key only (to tell whether a token is up to date)"""
+    return _build_cipher(get_encryption_keys()[:1])
@@ -0,0 +1,74 @@
+# messaging/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .display import get_signing_keys, message_display_data, message_delta
+from .models import Message
+from .realtime import can_view_conversation, conversation_group
+
+class ConversationConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes new messages of one conversation to a participant as small JSON deltas"""
+
+    async def connect(self):
+        self.user = self.scope['user']
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.group_name = None
+
+        if not self.user.is_authenticated or not await self.can_view_conversation():
+            await self.close()
+            return
+
+        self.group_name = conversation_group(self.conversation_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def message_new(self, event):
+        # Membership and blocks can change while the socket is open
+        if not await self.can_view_conversation():
+            await self.revoke()
+            return
+        
+        delta = await self.get_message_delta(event['message_id'])
+        if delta:
+            await self.send_json({'type': 'message', 'message': delta})
+
+    async def member_removed(self, event):
+        if self.user.id in event['user_ids']:
+            await self.revoke()
+
+    async def revoke(self):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            self.group_name = None
+        await self.close()
+
+    @database_sync_to_async
+    def can_view_conversation(self):
+        return can_view_conversation(self.user, self.conversation_id)
+
+    @database_sync_to_async
+    def get_message_delta(self, message_id):
+        message = Message.objects.select_related('sender').filter(
+            id=message_id,
+            conversation_id=self.conversation_id
+        ).first()
+        if not message:
+            return None
+
+        # The participant is looking at the conversation, so the message is read
+        if message.sender_id != self.user.id and not message.is_read:
+            Message.objects.filter(pk=message.pk).update(is_read=True)
+
+        session = self.scope['session']
+        message_data = message_display_data(
+            message,
+            self.user,
+            session,
+            get_signing_keys([message.sender_id])
+        )
+        if session.modified:
+            session.save()
+        return message_delta(message_data)
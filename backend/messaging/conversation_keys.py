@@ -0,0 +1,105 @@
+# messaging/conversation_keys.py
+from base64 import b64encode, b64decode
+from django.db import transaction
+from django.db.models import F
+from users.models import UserKey
+from .models import Conversation, UserConversationKey
+from .utils import generate_content_key, wrap_content_key, unwrap_content_key
+
+SESSION_CACHE_KEY = 'conversation_keys'
+
+class ConversationKeyUnavailable(Exception):
+    """The sender holds the current conversation key but cannot unwrap it without their private key"""
+
+def get_member_encryption_keys(conversation):
+    """Return {user_id: UserKey} with the active encryption key of every member"""
+    member_keys = {}
+    for encryption_key in UserKey.objects.filter(
+        user__conversations__conversation=conversation,
+        key_type='encryption',
+        is_active=True
+    ).order_by('created_at'):
+        # Newest active key wins
+        member_keys[encryption_key.user_id] = encryption_key
+    return member_keys
+
+def _cache_key(conversation_id, key_version):
+    return f"{conversation_id}:{key_version}"
+
+def _remember_key(session, conversation_id, key_version, conversation_key):
+    """Keep the unwrapped conversation key in the user's session"""
+    cached = session.get(SESSION_CACHE_KEY, {})
+    cached[_cache_key(conversation_id, key_version)] = b64encode(conversation_key).decode('utf-8')
+    session[SESSION_CACHE_KEY] = cached
+
+def get_conversation_key(session, user, conversation_id, key_version):
+    """Return the current user's conversation key for a version, unwrapping it at most once per session"""
+    cached = session.get(SESSION_CACHE_KEY, {})
+    cache_key = _cache_key(conversation_id, key_version)
+    if cache_key in cached:
+        return b64decode(cached[cache_key])
+
+    encryption_private_key = session.get('encryption_private_key')
+    if not encryption_private_key:
+        return None
+
+    user_key = UserConversationKey.objects.filter(
+        user=user,
+        conversation_id=conversation_id,
+        key_version=key_version
+    ).first()
+    if not user_key:
+        return None
+
+    conversation_key = unwrap_content_key(encryption_private_key, user_key.encrypted_key)
+    if conversation_key:
+        _remember_key(session, conversation_id, key_version, conversation_key)
+    return conversation_key
+
+def rotate_conversation_key(session, conversation, member_keys):
+    """Create a new conversation key version and wrap it once for each member"""
+    conversation_key = generate_content_key()
+
+    with transaction.atomic():
+        Conversation.objects.filter(pk=conversation.pk).update(key_version=F('key_version') + 1)
+        conversation.refresh_from_db(fields=['key_version'])
+
+        user_keys = []
+        for user_id, encryption_key in member_keys.items():
+            wrapped_key = wrap_content_key(encryption_key.public_key, conversation_key)
+            if wrapped_key:
+                user_keys.append(UserConversationKey(
+                    user_id=user_id,
+                    conversation=conversation,
+                    key_version=conversation.key_version,
+                    encrypted_key=wrapped_key,
+                    public_key_hash=encryption_key.public_key_hash
+                ))
+        UserConversationKey.objects.bulk_create(user_keys)
+
+    _remember_key(session, conversation.id, conversation.key_version, conversation_key)
+    return conversation.key_version, conversation_key
+
+def get_sending_key(session, user, conversation, member_keys=None):
+    """
+    Return (key_version, conversation_key) for encrypting a new message.
+    The key is rotated only when membership or a member's encryption key has changed;
+    a sender who cannot unwrap the current version gets ConversationKeyUnavailable.
+    """
+    if member_keys is None:
+        member_keys = get_member_encryption_keys(conversation)
+
+    if conversation.key_version:
+        wrapped_for = dict(UserConversationKey.objects.filter(
+            conversation=conversation,
+            key_version=conversation.key_version
+        ).values_list('user_id', 'public_key_hash'))
+        current = {user_id: key.public_key_hash for user_id, key in member_keys.items()}
+
+        if wrapped_for == current:
+            conversation_key = get_conversation_key(session, user, conversation.id, conversation.key_version)
+            if not conversation_key:
+                raise ConversationKeyUnavailable()
+            return conversation.key_version, conversation_key
+
+    return rotate_conversation_key(session, conversation, member_keys)
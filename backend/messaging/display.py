@@ -0,0 +1,120 @@
+# messaging/display.py
+from users.models import UserKey
+from .ciphers import get_message_cipher
+from .conversation_keys import get_conversation_key
+from .media import CONVERSATION_IMAGE_WIDTH, variant_srcset
+from .utils import decrypt_message, decrypt_with_content_key, unwrap_content_key
+
+def get_signing_keys(sender_ids):
+    """Return {user_id: UserKey} with each sender's active signing key, newest key winning"""
+    signing_keys = {}
+    for signing_key in UserKey.objects.filter(
+        user_id__in=sender_ids,
+        key_type='signing',
+        is_active=True
+    ).order_by('created_at'):
+        signing_keys[signing_key.user_id] = signing_key
+    return signing_keys
+
+def message_display_data(msg, user, session, signing_keys):
+    """Decrypt a message for the viewing user and prepare it for display"""
+    encryption_private_key = session.get('encryption_private_key')
+    
+    decrypted = False
+    message_data = {
+        'id': msg.id,
+        'sender': msg.sender,
+        'created_at': msg.created_at,
+        'is_mine': msg.sender_id == user.id,
+        'is_media': msg.is_media_message,
+        'media_type': msg.media_type,
+        'media_url': msg.media_display_url(CONVERSATION_IMAGE_WIDTH) if msg.is_image else (msg.media_file.url if msg.media_file else None),
+        'media_srcset': variant_srcset(msg.media_variants or {}) if msg.is_image else '',
+        'blockchain_verified': msg.integrity_verified
+    }
+    
+    # Handle standard encrypted messages
+    if not msg.is_encrypted and msg.encrypted_content:
+        try:
+            message_data['content'] = get_message_cipher().decrypt(msg.encrypted_content.encode()).decode()
+            decrypted = True
+        except Exception as e:
+            message_data['content'] = "[Encrypted message]"
+            
+    # Handle E2E encrypted messages
+    elif msg.is_encrypted:
+        if encryption_private_key:
+            try:
+                if msg.key_version:
+                    # Decrypt with the conversation key (unwrapped once per session)
+                    conversation_key = get_conversation_key(session, user, msg.conversation_id, msg.key_version)
+                    decrypted_content = None
+                    if conversation_key:
+                        decrypted_content = decrypt_with_content_key(
+                            conversation_key,
+                            msg.e2e_content,
+                            str(msg.id)
+                        )
+                elif msg.e2e_content:
+                    # Get the message content key encrypted for this user
+                    encrypted_content = msg.encrypted_contents.get(recipient=user)
+                    
+                    # Unwrap the content key with user's private key, then decrypt once
+                    content_key = unwrap_content_key(
+                        encryption_private_key,
+                        encrypted_content.encrypted_content
+                    )
+                    decrypted_content = None
+                    if content_key:
+                        decrypted_content = decrypt_with_content_key(
+                            content_key,
+                            msg.e2e_content,
+                            str(msg.id)
+                        )
+                else:
+                    # Older messages carry the full content encrypted per recipient
+                    encrypted_content = msg.encrypted_contents.get(recipient=user)
+                    
+                    decrypted_content = decrypt_message(
+                        encryption_private_key,
+                        encrypted_content.encrypted_content
+                    )
+                
+                if decrypted_content:
+                    message_data['content'] = decrypted_content
+                    decrypted = True
+                else:
+                    message_data['content'] = "[Could not decrypt message]"
+            except Exception as e:
+                message_data['content'] = "[End-to-end encrypted message - Error decrypting]"
+        else:
+            message_data['content'] = "[End-to-end encrypted message - No private key available]"
+    else:
+        message_data['content'] = ""
+    
+    # Use the stored signature result; only re-verify if it is missing or the key rotated
+    if msg.signature and not message_data['is_mine']:
+        signing_key = signing_keys.get(msg.sender_id)
+        key_hash = signing_key.public_key_hash if signing_key else None
+        if decrypted and msg.needs_signature_verification(key_hash):
+            msg.verify_signature(message_data['content'], signing_key)
+        
+        message_data['signature_verified'] = msg.signature_verified
+    
+    return message_data
+
+def message_delta(message_data):
+    """Return a JSON-serializable copy of message_data for real-time clients"""
+    return {
+        'id': str(message_data['id']),
+        'sender': message_data['sender'].username,
+        'created_at': message_data['created_at'].isoformat(),
+        'is_mine': message_data['is_mine'],
+        'is_media': bool(message_data['is_media']),
+        'media_type': message_data['media_type'],
+        'media_url': message_data['media_url'],
+        'media_srcset': message_data['media_srcset'],
+        'content': message_data['content'],
+        'signature_verified': message_data.get('signature_verified'),
+        'blockchain_verified': message_data['blockchain_verified'],
+    }
@@ -2,6 +2,23 @@ from django import forms
 from .models import Conversation
 from users.models import CustomUser
 
+def detect_media_type(content_type, filename):
+    """Return 'image' or 'video' for an upload, or None if the type is not allowed"""
+    if content_type:
+        if 'image' in content_type:
+            return 'image'
+        elif 'video' in content_type:
+            return 'video'
+        return None
+    
+    # Fallback to checking file extension
+    filename = filename.lower()
+    if filename.endswith(('.jpg', '.jpeg', '.png', '.gif')):
+        return 'image'
+    elif filename.endswith(('.mp4', '.mov', '.avi', '.webm')):
+        return 'video'
+    return None
+
 class MessageForm(forms.Form):
     content = forms.CharField(
         widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Type your message here...'}),
@@ -32,22 +49,10 @@ class MessageForm(forms.Form):
         
         # Auto-detect media type if file is provided
         if media_file:
-            if hasattr(media_file, 'content_type'):
-                if 'image' in media_file.content_type:
-                    cleaned_data['media_type'] = 'image'
-                elif 'video' in media_file.content_type:
-                    cleaned_data['media_type'] = 'video'
-                else:
-                    raise forms.ValidationError("Unsupported file type. Only images and videos are allowed.")
-            else:
-                # Fallback to checking file extension
-                filename = media_file.name.lower()
-                if filename.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    cleaned_data['media_type'] = 'image'
-                elif filename.endswith(('.mp4', '.mov', '.avi', '.webm')):
-                    cleaned_data['media_type'] = 'video'
-                else:
-                    raise forms.ValidationError("Unsupported file type. Only images and videos are allowed.")
+            media_type = detect_media_type(getattr(media_file, 'content_type', None), media_file.name)
+            if not media_type:
+                raise forms.ValidationError("Unsupported file type. Only images and videos are allowed.")
+            cleaned_data['media_type'] = media_type
         
         return cleaned_data
 
@@ -69,20 +74,9 @@ class CreateGroupForm(forms.ModelForm):
         
         if user:
             # Only show friends as potential participants
-            from friends.models import FriendRequest
-            from django.db.models import Q
-            
-            friends_1 = FriendRequest.objects.filter(
-                sender=user,
-                status='accepted'
-            ).values_list('receiver', flat=True)
-            
-            friends_2 = FriendRequest.objects.filter(
-                receiver=user,
-                status='accepted'
-            ).values_list('sender', flat=True)
+            from friends.friendships import friends_of
             
-            friends = CustomUser.objects.filter(Q(id__in=friends_1) | Q(id__in=friends_2))
+            friends = friends_of(user)
             
             # Only allow verified users for group chats
             verified_friends = friends.filter(is_verified=True)
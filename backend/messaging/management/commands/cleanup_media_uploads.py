@@ -0,0 +1,33 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from messaging.models import MediaUpload
+from messaging.uploads import UPLOAD_EXPIRY, discard_part
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were abandoned before completion'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - UPLOAD_EXPIRY
+        stale = MediaUpload.objects.filter(updated_at__lt=cutoff).exclude(status='complete')
+
+        count = 0
+        for upload in stale.iterator():
+            discard_part(upload)
+            count += 1
+        stale.delete()
+
+        # Part files whose upload record is gone
+        orphans = 0
+        if os.path.isdir(settings.CHUNKED_UPLOAD_DIR):
+            active = {str(upload_id) for upload_id in MediaUpload.objects.values_list('id', flat=True)}
+            for filename in os.listdir(settings.CHUNKED_UPLOAD_DIR):
+                upload_id, extension = os.path.splitext(filename)
+                if extension == '.part' and upload_id not in active:
+                    os.remove(os.path.join(settings.CHUNKED_UPLOAD_DIR, filename))
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {count} abandoned uploads and {orphans} orphaned part files"
+        ))
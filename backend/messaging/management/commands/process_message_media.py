@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from messaging.models import Message
+from messaging.media import process_message_media
+
+class Command(BaseCommand):
+    help = 'Generate resized image variants for message attachments that have not been processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess every image attachment')
+
+    def handle(self, *args, **options):
+        messages = Message.objects.filter(media_type='image').exclude(media_file='')
+        if not options['all']:
+            messages = messages.filter(media_processed_at__isnull=True)
+
+        message_ids = list(messages.values_list('id', flat=True))
+        self.stdout.write(f"Found {len(message_ids)} image attachments to process")
+
+        count = 0
+        for message_id in message_ids:
+            if not process_message_media(message_id):
+                continue
+            count += 1
+
+            if count % 10 == 0:
+                self.stdout.write(f"Processed {count}/{len(message_ids)} attachments...")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {count} attachments"))
@@ -0,0 +1,72 @@
+import time
+from cryptography.fernet import InvalidToken
+from django.core.management.base import BaseCommand
+from messaging.models import Message
+from messaging.ciphers import get_message_cipher, get_primary_cipher
+
+class Command(BaseCommand):
+    help = 'Re-encrypt stored message content with the current ENCRYPTION_KEY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Messages per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cipher = get_message_cipher()
+        primary = get_primary_cipher()
+
+        messages = Message.objects.filter(encrypted_content__isnull=False).exclude(encrypted_content='')
+        total = messages.count()
+        self.stdout.write(f"Found {total} messages with encrypted content")
+
+        scanned = 0
+        rotated = 0
+        unreadable = 0
+        last_pk = None
+        started = time.monotonic()
+
+        while True:
+            batch_qs = messages.order_by('pk').only('pk', 'encrypted_content')
+            if last_pk is not None:
+                batch_qs = batch_qs.filter(pk__gt=last_pk)
+            batch = list(batch_qs[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            batch_started = time.monotonic()
+            to_update = []
+            for message in batch:
+                token = message.encrypted_content.encode()
+                try:
+                    # Already encrypted with the primary key
+                    primary.decrypt(token)
+                    continue
+                except InvalidToken:
+                    pass
+
+                try:
+                    message.encrypted_content = cipher.rotate(token).decode()
+                    to_update.append(message)
+                except InvalidToken:
+                    unreadable += 1
+
+            Message.objects.bulk_update(to_update, ['encrypted_content'])
+
+            scanned += len(batch)
+            rotated += len(to_update)
+            batch_elapsed = time.monotonic() - batch_started
+            rate = len(batch) / batch_elapsed if batch_elapsed else 0
+            self.stdout.write(
+                f"Processed {scanned}/{total} messages, re-encrypted {rotated} ({rate:.0f} msg/s)"
+            )
+
+        elapsed = time.monotonic() - started
+        rate = scanned / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-encrypted {rotated} of {scanned} messages in {elapsed:.1f}s ({rate:.0f} msg/s)"
+        ))
+        if unreadable:
+            self.stdout.write(self.style.WARNING(
+                f"{unreadable} message(s) could not be decrypted with any configured key"
+            ))
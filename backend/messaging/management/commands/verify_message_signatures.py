@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from messaging.models import Message
+from users.models import UserKey
+
+class Command(BaseCommand):
+    help = 'Verify message signatures and store the results on each message'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-verify every signed message (audit), not only unverified or rotated ones'
+        )
+
+    def handle(self, *args, **options):
+        # E2E messages can only be verified at send time or by a recipient holding the private key
+        messages = Message.objects.filter(
+            signature__isnull=False,
+            is_encrypted=False
+        ).exclude(signature='')
+
+        # Load each sender's active signing key once, newest key winning
+        signing_keys = {}
+        for signing_key in UserKey.objects.filter(
+            user_id__in=messages.values('sender_id'),
+            key_type='signing',
+            is_active=True
+        ).order_by('created_at'):
+            signing_keys[signing_key.user_id] = signing_key
+
+        total = messages.count()
+        self.stdout.write(f"Found {total} signed messages")
+
+        checked = 0
+        failed = 0
+        for message in messages.iterator(chunk_size=500):
+            signing_key = signing_keys.get(message.sender_id)
+            key_hash = signing_key.public_key_hash if signing_key else None
+
+            if not options['all'] and not message.needs_signature_verification(key_hash):
+                continue
+
+            try:
+                content = message.decrypt_message()
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Could not decrypt message {message.id}: {e}"))
+                continue
+
+            if not message.verify_signature(content, signing_key):
+                failed += 1
+            checked += 1
+
+            if checked % 100 == 0:
+                self.stdout.write(f"Verified {checked} messages...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Verified {checked} messages, {failed} signature(s) failed verification"
+        ))
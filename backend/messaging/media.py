@@ -0,0 +1,154 @@
+# messaging/media.py
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+from users.background import retry_on_lock
+from users.media_access import index_media_paths
+from users.models import MediaAsset
+
+logger = logging.getLogger(__name__)
+
+# Widths generated for image attachments
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+CONVERSATION_IMAGE_WIDTH = 640
+MEDIA_PAGE_IMAGE_WIDTH = 1280
+IMAGE_VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# Media work runs here instead of in the request thread. Jobs are held in memory only;
+# anything lost on restart is picked up by the process_message_media command.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='message-media')
+
+def _prepare_image(image):
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+def _save_formats(variants, resized, name_prefix, width):
+    """Save one resized image in every variant format and record the paths in variants"""
+    for name, options in IMAGE_VARIANT_FORMATS.items():
+        variant = resized.convert('RGB') if options['format'] == 'JPEG' else resized
+        buffer = BytesIO()
+        # No exif/icc arguments are passed, so metadata is not copied
+        variant.save(buffer, **options)
+        extension = 'jpg' if name == 'jpeg' else name
+        path = default_storage.save(
+            f"{name_prefix}_{width}.{extension}",
+            ContentFile(buffer.getvalue())
+        )
+        variants[name][str(width)] = path
+
+def generate_image_variants(image_file, name_prefix, widths=IMAGE_VARIANT_WIDTHS):
+    """
+    Write resized, metadata-free WebP and JPEG copies of an image.
+    Returns {format: {width: storage path}}.
+    """
+    variants = {name: {} for name in IMAGE_VARIANT_FORMATS}
+
+    with Image.open(image_file) as image:
+        if getattr(image, 'is_animated', False):
+            # Resizing would drop the animation; keep serving the original
+            return {}
+
+        image = _prepare_image(image)
+        widths = [width for width in widths if width < image.width] or [image.width]
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            _save_formats(variants, image.resize((width, height), Image.LANCZOS), name_prefix, width)
+
+    return variants
+
+def generate_thumbnails(image_file, name_prefix, sizes):
+    """
+    Write fixed-size, center-cropped WebP and JPEG thumbnails for each (width, height) in sizes.
+    Returns {format: {width: storage path}}.
+    """
+    variants = {name: {} for name in IMAGE_VARIANT_FORMATS}
+
+    with Image.open(image_file) as image:
+        image = _prepare_image(image)
+        for width, height in sizes:
+            _save_formats(variants, ImageOps.fit(image, (width, height), Image.LANCZOS), name_prefix, width)
+
+    return variants
+
+def variant_paths(variants):
+    """Every generated file in a {format: {width: path}} variants dict"""
+    return [path for by_width in (variants or {}).values() for path in by_width.values()]
+
+def delete_variant_files(paths):
+    """Remove generated variant files and their access index entries"""
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except OSError as e:
+            logger.error(f"Error deleting image variant {path}: {e}")
+    MediaAsset.objects.filter(path__in=paths).delete()
+
+def process_message_media(message_id):
+    """Generate image variants for a message attachment and record them on the message"""
+    from .models import Message
+
+    message = Message.objects.filter(pk=message_id).first()
+    if not message or not message.media_file or message.media_type != 'image':
+        return None
+
+    name_prefix = f"message_media/variants/{message.id}/{os.path.splitext(os.path.basename(message.media_file.name))[0]}"
+    try:
+        with message.media_file.open('rb') as image_file:
+            variants = generate_image_variants(image_file, name_prefix)
+    except Exception as e:
+        logger.error(f"Error processing media for message {message.id}: {e}")
+        variants = {}
+
+    new_paths = variant_paths(variants)
+    index_media_paths(new_paths, 'message', message.sender_id, str(message.conversation_id))
+    Message.objects.filter(pk=message.pk).update(
+        media_variants=variants,
+        media_processed_at=timezone.now()
+    )
+
+    # Reprocessing writes new files, so drop the ones they replace
+    stale = set(variant_paths(message.media_variants)) - set(new_paths)
+    if stale:
+        delete_variant_files(list(stale))
+    return variants
+
+def _process_in_background(message_id):
+    try:
+        retry_on_lock(process_message_media, message_id)
+    except Exception as e:
+        logger.error(f"Error processing media for message {message_id}: {e}")
+    finally:
+        close_old_connections()
+
+def schedule_media_processing(message_id):
+    """Queue media processing for a message without blocking the request"""
+    _executor.submit(_process_in_background, message_id)
+
+def pick_variant(variants, target_width, fmt='jpeg'):
+    """Return the storage path of the smallest variant at least target_width wide (or the largest)"""
+    by_width = variants.get(fmt) or {}
+    if not by_width:
+        return None
+    widths = sorted(int(width) for width in by_width)
+    chosen = next((width for width in widths if width >= target_width), widths[-1])
+    return by_width[str(chosen)]
+
+def variant_srcset(variants, fmt='webp'):
+    """Return an img srcset string for the variants of one format"""
+    by_width = variants.get(fmt) or {}
+    return ', '.join(
+        f"{default_storage.url(path)} {width}w"
+        for width, path in sorted(by_width.items(), key=lambda item: int(item[0]))
+    )
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_message_blockchain_hash_message_integrity_verified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='signature_key_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='signature_verified',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='signature_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
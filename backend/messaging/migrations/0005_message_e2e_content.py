@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_message_signature_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='e2e_content',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('messaging', '0005_message_e2e_content'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='userconversationkey',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='key_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='key_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userconversationkey',
+            name='key_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='userconversationkey',
+            name='public_key_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userconversationkey',
+            unique_together={('user', 'conversation', 'key_version')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_conversation_key_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='media_processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='media_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:56
+
+from django.db import migrations, models
+import users.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_message_media_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='media_file',
+            field=models.FileField(blank=True, null=True, storage=users.storage.ContentAddressedStorage(), upload_to='message_media/'),
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
-from django.conf import settings
-from users.models import CustomUser
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from users.models import CustomUser, UserKey
+from users.storage import ContentAddressedStorage
 import uuid
-from cryptography.fernet import Fernet
-from django.conf import settings
+from .ciphers import get_message_cipher
+from .media import pick_variant
 
 class Conversation(models.Model):
     CONVERSATION_TYPES = (
@@ -14,6 +16,7 @@ class Conversation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100, blank=True, null=True)  # Only used for group conversations
     conversation_type = models.CharField(max_length=10, choices=CONVERSATION_TYPES, default='direct')
+    key_version = models.PositiveIntegerField(default=0)  # Current E2E conversation key version (0 = none yet)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -60,8 +63,12 @@ class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_messages')
     encrypted_content = models.TextField(blank=True, null=True)  # Store encrypted message content
-    media_file = models.FileField(upload_to='message_media/', blank=True, null=True)  # For media messages
+    e2e_content = models.TextField(blank=True, null=True)  # E2E content, AES-GCM encrypted once per message
+    key_version = models.PositiveIntegerField(blank=True, null=True)  # Conversation key version used for e2e_content
+    media_file = models.FileField(upload_to='message_media/', storage=ContentAddressedStorage(), blank=True, null=True)  # For media messages
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPES, default='none')
+    media_variants = models.JSONField(default=dict, blank=True)  # {format: {width: path}} for resized images
+    media_processed_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     
@@ -71,21 +78,58 @@ class Message(models.Model):
     blockchain_hash = models.CharField(max_length=64, blank=True, null=True)
     integrity_verified = models.BooleanField(default=False)
     
+    # Persisted signature verification result (checked once, not on every render)
+    signature_verified = models.BooleanField(blank=True, null=True)
+    signature_key_hash = models.CharField(max_length=64, blank=True, null=True)  # Hash of the key that verified it
+    signature_verified_at = models.DateTimeField(blank=True, null=True)
+    
     def encrypt_message(self, content):
         if content:
-            key = settings.ENCRYPTION_KEY.encode()
-            f = Fernet(key)
-            encrypted_message = f.encrypt(content.encode())
+            encrypted_message = get_message_cipher().encrypt(content.encode())
             self.encrypted_content = encrypted_message.decode()
         
     def decrypt_message(self):
         if not self.encrypted_content:
             return ""
-        key = settings.ENCRYPTION_KEY.encode()
-        f = Fernet(key)
-        decrypted_message = f.decrypt(self.encrypted_content.encode())
+        decrypted_message = get_message_cipher().decrypt(self.encrypted_content.encode())
         return decrypted_message.decode()
     
+    def needs_signature_verification(self, key_hash):
+        """Whether the stored signature result is missing or was made with a rotated key"""
+        if not self.signature:
+            return False
+        return self.signature_verified is None or self.signature_key_hash != key_hash
+    
+    def verify_signature(self, content, signing_key=None, commit=True):
+        """Verify the sender's signature over content and store the outcome on the message"""
+        if not self.signature:
+            return None
+        
+        if signing_key is None:
+            signing_key = UserKey.objects.filter(
+                user_id=self.sender_id,
+                key_type='signing',
+                is_active=True
+            ).order_by('-created_at').first()
+        
+        is_verified = False
+        if signing_key:
+            from messaging.utils import verify_signature
+            is_verified = verify_signature(signing_key.public_key, content, self.signature)
+        
+        self.signature_verified = is_verified
+        self.signature_key_hash = signing_key.public_key_hash if signing_key else None
+        self.signature_verified_at = timezone.now()
+        
+        if commit and not self._state.adding:
+            # Update without triggering another save cycle
+            type(self).objects.filter(pk=self.pk).update(
+                signature_verified=self.signature_verified,
+                signature_key_hash=self.signature_key_hash,
+                signature_verified_at=self.signature_verified_at
+            )
+        return is_verified
+    
     @property
     def is_media_message(self):
         return self.media_type != 'none' and self.media_file
@@ -98,6 +142,15 @@ class Message(models.Model):
     def is_video(self):
         return self.media_type == 'video'
     
+    def media_display_url(self, width):
+        """URL of the smallest processed variant at least width wide, else the original file"""
+        if not self.media_file:
+            return None
+        path = pick_variant(self.media_variants or {}, width)
+        if path:
+            return default_storage.url(path)
+        return self.media_file.url
+    
     def save(self, *args, **kwargs):
         # First save to get an ID if this is a new message
         is_new = self.pk is None
@@ -122,10 +175,34 @@ class Message(models.Model):
             return f"Media message from {self.sender.username} in {self.conversation}"
         return f"Message from {self.sender.username} in {self.conversation}"
 
+class MediaUpload(models.Model):
+    """A chunked, resumable attachment upload; becomes a Message once every byte has arrived"""
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='media_uploads')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='media_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    media_type = models.CharField(max_length=10)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    message = models.OneToOneField(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} by {self.user.username} ({self.received_size}/{self.total_size})"
+
 class EncryptedMessageContent(models.Model):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='encrypted_contents')
     recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_encrypted_messages')
-    encrypted_content = models.TextField()  # Content encrypted with recipient's public key
+    encrypted_content = models.TextField()  # Message content key (or legacy full content) encrypted with recipient's public key
     
     class Meta:
         unique_together = ('message', 'recipient')
@@ -135,9 +212,11 @@ class UserConversationKey(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='conversation_keys')
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='user_keys')
     encrypted_key = models.TextField()  # The conversation key encrypted with the user's public key
+    key_version = models.PositiveIntegerField(default=1)
+    public_key_hash = models.CharField(max_length=64, blank=True, null=True)  # Hash of the public key used to wrap it
     
     class Meta:
-        unique_together = ('user', 'conversation')
+        unique_together = ('user', 'conversation', 'key_version')
 
 class UserMessageKey(models.Model):
     """Store individual encrypted message content for each recipient"""
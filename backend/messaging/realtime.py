@@ -0,0 +1,77 @@
+# messaging/realtime.py
+import asyncio
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from users.blocks import blocked_user_ids, forget_memoized_blocks
+
+logger = logging.getLogger(__name__)
+
+def conversation_group(conversation_id):
+    """Channel layer group for clients viewing a conversation"""
+    return f"conversation_{conversation_id}"
+
+def can_view_conversation(user, conversation_id):
+    """Same checks as view_conversation: participant and no block with other participants"""
+    from .models import ConversationParticipant
+    
+    if not ConversationParticipant.objects.filter(
+        conversation_id=conversation_id,
+        user=user
+    ).exists():
+        return False
+    
+    other_users = ConversationParticipant.objects.filter(
+        conversation_id=conversation_id
+    ).exclude(user=user).values_list('user_id', flat=True)
+    # Sockets and event streams re-check with the same user object, so read the blocks afresh
+    forget_memoized_blocks(user)
+    return not blocked_user_ids(user).intersection(other_users)
+
+async def wait_for_group_event(group_name, timeout):
+    """Wait up to timeout seconds for an event sent to a channel layer group"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        await asyncio.sleep(timeout)
+        return False
+    
+    channel_name = await channel_layer.new_channel()
+    await channel_layer.group_add(group_name, channel_name)
+    try:
+        await asyncio.wait_for(channel_layer.receive(channel_name), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        await channel_layer.group_discard(group_name, channel_name)
+
+def publish_new_message(message):
+    """Tell clients connected to the conversation that a new message was sent"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    
+    try:
+        async_to_sync(channel_layer.group_send)(conversation_group(message.conversation_id), {
+            'type': 'message.new',
+            'message_id': str(message.id),
+        })
+    except Exception as e:
+        # The message is already saved; clients will see it on their next load
+        logger.error(f"Error publishing message {message.id}: {e}")
+
+def publish_access_revoked(conversation_ids, user_ids):
+    """Tell open connections of these users that they can no longer view the conversations"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    
+    for conversation_id in conversation_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(conversation_group(conversation_id), {
+                'type': 'member.removed',
+                'user_ids': list(user_ids),
+            })
+        except Exception as e:
+            # Connections still re-check access before every message they are sent
+            logger.error(f"Error publishing member removal for conversation {conversation_id}: {e}")
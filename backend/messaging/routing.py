@@ -0,0 +1,6 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/messaging/<uuid:conversation_id>/', consumers.ConversationConsumer.as_asgi()),
+]
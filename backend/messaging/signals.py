@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.media_access import index_field_file, invalidate_media_access
+from users.models import UserBlock
+from users.storage import release_blob
+from .media import delete_variant_files, variant_paths
+from .models import ConversationParticipant, Message
+from .realtime import publish_access_revoked
+
+@receiver(post_save, sender=Message)
+def index_message_media(sender, instance, update_fields=None, **kwargs):
+    """Register attachments so only conversation participants can download them"""
+    index_field_file(
+        instance, 'media_file', 'message', instance.sender_id,
+        object_id=str(instance.conversation_id), update_fields=update_fields
+    )
+
+@receiver(post_delete, sender=Message)
+def release_message_media(sender, instance, **kwargs):
+    if instance.media_file:
+        release_blob(instance.media_file.name)
+    # Resized copies would otherwise stay downloadable after the message is removed
+    paths = variant_paths(instance.media_variants)
+    if paths:
+        delete_variant_files(paths)
+
+@receiver(post_save, sender=ConversationParticipant)
+@receiver(post_delete, sender=ConversationParticipant)
+def refresh_media_access(sender, instance, **kwargs):
+    """Joining or leaving changes which attachments the user may download"""
+    invalidate_media_access(instance.user_id)
+
+@receiver(post_delete, sender=ConversationParticipant)
+def disconnect_removed_member(sender, instance, **kwargs):
+    """Close the open connections of a member who was removed or left"""
+    conversation_id, user_id = instance.conversation_id, instance.user_id
+    transaction.on_commit(lambda: publish_access_revoked([conversation_id], [user_id]))
+
+@receiver(post_save, sender=UserBlock)
+def disconnect_blocked_users(sender, instance, created, **kwargs):
+    """A block hides every conversation the two users share from both of them"""
+    if not created:
+        return
+    
+    user_ids = [instance.blocker_id, instance.blocked_user_id]
+    conversation_ids = list(ConversationParticipant.objects.filter(
+        user_id=instance.blocker_id,
+        conversation__participants__user_id=instance.blocked_user_id
+    ).values_list('conversation_id', flat=True))
+    if conversation_ids:
+        transaction.on_commit(lambda: publish_access_revoked(conversation_ids, user_ids))
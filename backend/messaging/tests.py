@@ -1,3 +1,418 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from cryptography.fernet import Fernet
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from users.models import CustomUser, MediaAsset, UserBlock
+from .ciphers import get_primary_cipher
+from .consumers import ConversationConsumer
+from .conversation_keys import ConversationKeyUnavailable, get_conversation_key, get_sending_key
+from .media import process_message_media, variant_paths
+from .models import Conversation, ConversationParticipant, MediaUpload, Message, UserConversationKey
+from .realtime import can_view_conversation, publish_new_message
+from .uploads import UploadOffsetError, append_chunk, part_path
+from .utils import decrypt_with_content_key, encrypt_with_content_key
 
-# Create your tests here.
+
+def create_user_with_keys(username, phone_number):
+    """Create a user and return it with the private keys generated for it on signup"""
+    user = CustomUser.objects.create_user(
+        username=username, password='pw', email=f'{username}@example.com', phone_number=phone_number
+    )
+    return user, cache.get(f"user_private_keys_{user.id}")
+
+
+def create_conversation(users, conversation_type='group'):
+    conversation = Conversation.objects.create(conversation_type=conversation_type, name='Team')
+    ConversationParticipant.objects.bulk_create([
+        ConversationParticipant(conversation=conversation, user=user, is_admin=(i == 0))
+        for i, user in enumerate(users)
+    ])
+    return conversation
+
+
+class ConversationKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.alice_keys = create_user_with_keys('alice', '100')
+        self.bob, self.bob_keys = create_user_with_keys('bob', '200')
+        self.carol, self.carol_keys = create_user_with_keys('carol', '300')
+        self.conversation = create_conversation([self.alice, self.bob, self.carol])
+
+    def session_for(self, keys):
+        return {'encryption_private_key': keys['encryption_private_key']}
+
+    def test_round_trip(self):
+        key_version, conversation_key = get_sending_key(self.session_for(self.alice_keys), self.alice, self.conversation)
+        self.assertEqual(key_version, 1)
+        self.assertEqual(UserConversationKey.objects.filter(conversation=self.conversation, key_version=1).count(), 3)
+
+        ciphertext = encrypt_with_content_key(conversation_key, 'hello', 'message-id')
+        bob_key = get_conversation_key(self.session_for(self.bob_keys), self.bob, self.conversation.id, key_version)
+        self.assertEqual(decrypt_with_content_key(bob_key, ciphertext, 'message-id'), 'hello')
+
+    def test_current_key_is_reused_by_other_senders(self):
+        get_sending_key(self.session_for(self.alice_keys), self.alice, self.conversation)
+
+        key_version, _ = get_sending_key(self.session_for(self.bob_keys), self.bob, self.conversation)
+        self.assertEqual(key_version, 1)
+
+        # Without the private key the sender cannot unwrap the key, which is not a reason to rotate
+        with self.assertRaises(ConversationKeyUnavailable):
+            get_sending_key({}, self.carol, self.conversation)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.key_version, 1)
+
+    def test_removed_member_cannot_unwrap_new_version(self):
+        get_sending_key(self.session_for(self.alice_keys), self.alice, self.conversation)
+        ConversationParticipant.objects.filter(conversation=self.conversation, user=self.carol).delete()
+
+        key_version, conversation_key = get_sending_key(self.session_for(self.alice_keys), self.alice, self.conversation)
+        self.assertEqual(key_version, 2)
+        self.assertIsNone(get_conversation_key(self.session_for(self.carol_keys), self.carol, self.conversation.id, 2))
+        self.assertEqual(
+            get_conversation_key(self.session_for(self.bob_keys), self.bob, self.conversation.id, 2),
+            conversation_key
+        )
+
+    def test_signature_result_is_persisted(self):
+        self.client.force_login(self.alice)
+        session = self.client.session
+        session.update(self.alice_keys)
+        session.save()
+        self.client.post(reverse('view_conversation', args=[self.conversation.id]), {
+            'content': 'signed hello',
+            'enable_e2e': 'on',
+        })
+
+        message = Message.objects.get(conversation=self.conversation)
+        self.assertEqual(message.key_version, 1)
+        self.assertTrue(message.signature_verified)
+        self.assertIsNotNone(message.signature_key_hash)
+        verified_at = message.signature_verified_at
+
+        # Viewing the conversation uses the stored result rather than verifying again
+        self.client.force_login(self.bob)
+        session = self.client.session
+        session.update(self.bob_keys)
+        session.save()
+        response = self.client.get(reverse('view_conversation', args=[self.conversation.id]))
+        self.assertContains(response, 'signed hello')
+        message.refresh_from_db()
+        self.assertEqual(message.signature_verified_at, verified_at)
+
+
+class MessageCipherTests(TestCase):
+    def setUp(self):
+        self.old_key = Fernet.generate_key().decode()
+        self.new_key = Fernet.generate_key().decode()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.conversation = create_conversation([self.alice])
+
+    def create_message(self, content):
+        message = Message(conversation=self.conversation, sender=self.alice)
+        message.encrypt_message(content)
+        message.save()
+        return message
+
+    def test_old_key_messages_still_decrypt(self):
+        with override_settings(ENCRYPTION_KEY=self.old_key, ENCRYPTION_OLD_KEYS=[]):
+            message = self.create_message('before rotation')
+
+        with override_settings(ENCRYPTION_KEY=self.new_key, ENCRYPTION_OLD_KEYS=[self.old_key]):
+            message.refresh_from_db()
+            self.assertEqual(message.decrypt_message(), 'before rotation')
+
+    def test_reencrypt_moves_messages_to_primary_key(self):
+        with override_settings(ENCRYPTION_KEY=self.old_key, ENCRYPTION_OLD_KEYS=[]):
+            old_message = self.create_message('before rotation')
+
+        with override_settings(ENCRYPTION_KEY=self.new_key, ENCRYPTION_OLD_KEYS=[self.old_key]):
+            new_message = self.create_message('after rotation')
+            new_token = new_message.encrypted_content
+            call_command('reencrypt_messages', stdout=StringIO())
+
+            old_message.refresh_from_db()
+            new_message.refresh_from_db()
+            self.assertEqual(get_primary_cipher().decrypt(old_message.encrypted_content.encode()), b'before rotation')
+            # Messages already under the primary key are left alone
+            self.assertEqual(new_message.encrypted_content, new_token)
+
+        with override_settings(ENCRYPTION_KEY=self.new_key, ENCRYPTION_OLD_KEYS=[]):
+            self.assertEqual(old_message.decrypt_message(), 'before rotation')
+
+
+@override_settings(ENCRYPTION_KEY=Fernet.generate_key().decode(), ENCRYPTION_OLD_KEYS=[])
+class ConversationConsumerTests(TransactionTestCase):
+    def setUp(self):
+        # Flushed tables reuse user ids, so drop block sets cached by earlier tests
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+        self.carol = CustomUser.objects.create_user(
+            username='carol', password='pw', email='carol@example.com', phone_number='300'
+        )
+        self.conversation = create_conversation([self.alice, self.bob, self.carol])
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            ConversationConsumer.as_asgi(), f"/ws/messaging/{self.conversation.id}/"
+        )
+        communicator.scope['user'] = user
+        communicator.scope['session'] = SessionStore()
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': self.conversation.id}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def send(self, content):
+        def create():
+            message = Message(conversation=self.conversation, sender=self.alice)
+            message.encrypt_message(content)
+            message.save()
+            publish_new_message(message)
+        await sync_to_async(create)()
+
+    async def test_participant_receives_new_messages(self):
+        communicator = await self.connect(self.bob)
+        await self.send('hello')
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['message']['content'], 'hello')
+        await communicator.disconnect()
+
+    async def test_removed_member_is_disconnected(self):
+        communicator = await self.connect(self.carol)
+        await sync_to_async(ConversationParticipant.objects.filter(user=self.carol).delete)()
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+        await self.send('after removal')
+        self.assertTrue(await communicator.receive_nothing())
+
+    async def test_blocked_user_is_disconnected(self):
+        communicator = await self.connect(self.bob)
+        await sync_to_async(UserBlock.objects.create)(blocker=self.alice, blocked_user=self.bob)
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+    async def test_access_is_rechecked_before_each_message(self):
+        communicator = await self.connect(self.bob)
+        with mock.patch('messaging.signals.publish_access_revoked'):
+            await sync_to_async(UserBlock.objects.create)(blocker=self.bob, blocked_user=self.alice)
+
+        await self.send('after block')
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+
+@override_settings(ENCRYPTION_KEY=Fernet.generate_key().decode(), ENCRYPTION_OLD_KEYS=[])
+class ConversationEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+        self.conversation = create_conversation([self.alice, self.bob])
+        self.url = reverse('conversation_events', args=[self.conversation.id])
+        self.client.force_login(self.bob)
+
+    def create_message(self, content, created_at):
+        message = Message(conversation=self.conversation, sender=self.alice)
+        message.encrypt_message(content)
+        message.save()
+        Message.objects.filter(pk=message.pk).update(created_at=created_at)
+        return message
+
+    def test_messages_sharing_a_timestamp_are_not_skipped(self):
+        created_at = timezone.now()
+        messages = sorted(
+            [self.create_message('first', created_at), self.create_message('second', created_at)],
+            key=lambda message: str(message.id)
+        )
+
+        cursor = f"{created_at.isoformat()}|{messages[0].id}"
+        response = self.client.get(self.url, {'mode': 'poll', 'since': cursor})
+        self.assertEqual([delta['id'] for delta in response.json()['messages']], [str(messages[1].id)])
+        self.assertEqual(response.json()['cursor'], f"{created_at.isoformat()}|{messages[1].id}")
+
+    def test_poll_rechecks_membership(self):
+        async def remove_bob(group_name, timeout):
+            await sync_to_async(ConversationParticipant.objects.filter(user=self.bob).delete)()
+
+        with mock.patch('messaging.views.wait_for_group_event', side_effect=remove_bob):
+            response = self.client.get(self.url, {'mode': 'poll'})
+        self.assertEqual(response.status_code, 403)
+
+
+class MessageMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.conversation = create_conversation([self.alice])
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, size=(1600, 1200)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_reprocessing_replaces_old_variants(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.alice, media_type='image', media_file=self.upload()
+        )
+        old_paths = variant_paths(process_message_media(message.pk))
+        self.assertEqual(len(old_paths), 6)
+
+        call_command('process_message_media', '--all', stdout=StringIO())
+        message.refresh_from_db()
+        new_paths = variant_paths(message.media_variants)
+        self.assertTrue(new_paths and not set(new_paths) & set(old_paths))
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root, path)) for path in old_paths))
+        self.assertFalse(MediaAsset.objects.filter(path__in=old_paths).exists())
+        self.assertTrue(all(os.path.exists(os.path.join(self.media_root, path)) for path in new_paths))
+
+    def test_deleting_the_message_removes_its_variants(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.alice, media_type='image', media_file=self.upload()
+        )
+        paths = variant_paths(process_message_media(message.pk))
+
+        Message.objects.get(pk=message.pk).delete()
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root, path)) for path in paths))
+        self.assertFalse(MediaAsset.objects.filter(path__in=paths).exists())
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(self.media_root, 'upload_tmp')
+        )
+        self.override.enable()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100', is_verified=True
+        )
+        self.conversation = create_conversation([self.alice])
+        self.client.force_login(self.alice)
+        self.content = b'0123456789' * 10
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def start(self):
+        response = self.client.post(reverse('start_media_upload', args=[self.conversation.id]), {
+            'filename': 'clip.mp4', 'content_type': 'video/mp4', 'size': len(self.content)
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.put(
+            reverse('media_upload_chunk', args=[upload_id]), data,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunks_must_arrive_at_the_current_offset(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:40]).json()['offset'], 40)
+
+        response = self.put_chunk(upload_id, 20, self.content[20:60])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 40)
+
+        # Completing early is refused too
+        response = self.client.post(reverse('complete_media_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Message.objects.exists())
+
+    def test_repeated_chunk_is_refused(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:40]).json()['offset'], 40)
+
+        # A retry of the same chunk is refused and leaves the part file alone
+        response = self.put_chunk(upload_id, 0, b'x' * 40)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 40)
+
+        # A writer that read the upload before the first chunk was recorded is refused too
+        stale = MediaUpload.objects.get(pk=upload_id)
+        stale.received_size = 0
+        with self.assertRaises(UploadOffsetError):
+            append_chunk(stale, BytesIO(b'y' * 40), 0)
+
+        with open(part_path(stale), 'rb') as part:
+            self.assertEqual(part.read(), self.content[:40])
+        self.assertEqual(MediaUpload.objects.get(pk=upload_id).received_size, 40)
+
+    def test_complete_creates_one_message(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.content[:50])
+        self.assertEqual(self.client.get(reverse('media_upload_chunk', args=[upload_id])).json()['offset'], 50)
+        self.put_chunk(upload_id, 50, self.content[50:])
+
+        response = self.client.post(reverse('complete_media_upload', args=[upload_id]), {'content': ''})
+        self.assertEqual(response.status_code, 200)
+        message = Message.objects.get(pk=response.json()['message_id'])
+        self.assertEqual(message.media_type, 'video')
+        with message.media_file.open('rb') as media_file:
+            self.assertEqual(media_file.read(), self.content)
+        self.assertEqual(MediaUpload.objects.get(pk=upload_id).message, message)
+
+        # A repeated completion does not create another message
+        response = self.client.post(reverse('complete_media_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_concurrent_completion_is_refused(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.content)
+
+        # Another request claims the upload after this one passed its status check
+        def complete_elsewhere(user, conversation_id):
+            MediaUpload.objects.filter(pk=upload_id).update(status='complete')
+            return can_view_conversation(user, conversation_id)
+
+        with mock.patch('messaging.views.can_view_conversation', side_effect=complete_elsewhere):
+            response = self.client.post(reverse('complete_media_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Message.objects.exists())
+
+    def test_failed_completion_after_the_part_file_moved_is_not_resumable(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.content)
+
+        def send_after_move(request, conversation, participants, content, media_file, media_type):
+            os.remove(media_file.temporary_file_path())
+            raise RuntimeError('storage failed')
+
+        with mock.patch('messaging.views._send_message', side_effect=send_after_move):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('complete_media_upload', args=[upload_id]))
+        self.assertEqual(MediaUpload.objects.get(pk=upload_id).status, 'failed')
+        self.assertFalse(Message.objects.exists())
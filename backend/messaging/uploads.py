@@ -0,0 +1,78 @@
+# messaging/uploads.py
+import fcntl
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+# Each chunk request handles at most this much data, so worker time per request stays bounded
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_UPLOAD_SIZE = 500 * 1024 * 1024
+# Unfinished uploads older than this are removed by cleanup_media_uploads
+UPLOAD_EXPIRY = timedelta(hours=24)
+READ_SIZE = 64 * 1024
+
+class UploadOffsetError(Exception):
+    """The client sent a chunk for the wrong position"""
+
+class PartFile(File):
+    """An assembled upload on disk; storage can move it into place instead of copying"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+def append_chunk(upload, stream, offset):
+    """
+    Append one chunk from a request stream to the upload's part file and record it.
+    Returns the number of bytes written.
+    """
+    path = part_path(upload)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+
+    with open(path, 'ab') as part:
+        # One writer per part file; a retried or concurrent PUT waits here and then
+        # sees the offset the first one recorded. Row locks are no help on SQLite.
+        fcntl.flock(part, fcntl.LOCK_EX)
+        upload.refresh_from_db(fields=['received_size', 'status'])
+        if upload.status != 'uploading' or offset != upload.received_size:
+            raise UploadOffsetError(f"Expected offset {upload.received_size}, got {offset}")
+
+        # Drop bytes from an earlier chunk that was cut off before it was recorded
+        part.truncate(offset)
+
+        limit = min(UPLOAD_CHUNK_SIZE, upload.total_size - offset)
+        written = 0
+        while written < limit:
+            data = stream.read(min(READ_SIZE, limit - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+        part.flush()
+
+        # Record the chunk before releasing the lock, and only if nothing else moved the offset
+        claimed = type(upload).objects.filter(
+            pk=upload.pk, received_size=offset, status='uploading'
+        ).update(received_size=offset + written, updated_at=timezone.now())
+        if not claimed:
+            upload.refresh_from_db(fields=['received_size', 'status'])
+            raise UploadOffsetError(f"Upload changed while writing at offset {offset}")
+        upload.received_size = offset + written
+
+    return written
+
+def open_assembled_file(upload):
+    """Return the completed upload as a File named after the original upload"""
+    part = PartFile(open(part_path(upload), 'rb'))
+    part.name = upload.filename
+    return part
+
+def discard_part(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
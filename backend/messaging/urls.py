@@ -5,10 +5,15 @@ urlpatterns = [
     path('', views.conversation_list, name='conversation_list'),
     path('start/<int:user_id>/', views.start_conversation, name='start_conversation'),
     path('view/<uuid:conversation_id>/', views.view_conversation, name='view_conversation'),
+    path('view/<uuid:conversation_id>/events/', views.conversation_events, name='conversation_events'),
+    path('notifications/events/', views.notification_events, name='notification_events'),
     path('group/create/', views.create_group, name='create_group'),
     path('group/<uuid:conversation_id>/remove/<int:user_id>/', views.remove_from_group, name='remove_from_group'),
     path('group/<uuid:conversation_id>/leave/', views.leave_group, name='leave_group'),
     path('group/<uuid:conversation_id>/delete/', views.delete_group, name='delete_group'),
     path('media/<uuid:message_id>/', views.view_media, name='view_media'),
+    path('view/<uuid:conversation_id>/uploads/', views.start_media_upload, name='start_media_upload'),
+    path('uploads/<uuid:upload_id>/', views.media_upload_chunk, name='media_upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.complete_media_upload, name='complete_media_upload'),
     path('group/<uuid:conversation_id>/manage/', views.manage_group_members, name='manage_group_members'),
 ]
\ No newline at end of file
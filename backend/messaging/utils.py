@@ -1,7 +1,9 @@
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from base64 import b64encode, b64decode
+import os
 
 def generate_key_pair():
     """Generate a new RSA key pair"""
@@ -128,4 +130,68 @@ def decrypt_message(private_key_pem, encrypted_message):
         return plaintext.decode('utf-8')
     except Exception as e:
         print(f"Error decrypting message: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def generate_content_key():
+    """Generate a random 256-bit symmetric key for AES-GCM"""
+    return AESGCM.generate_key(bit_length=256)
+
+def encrypt_with_content_key(content_key, message, associated_data=None):
+    """Encrypt a message once with AES-GCM under a symmetric key"""
+    try:
+        nonce = os.urandom(12)
+        aad = associated_data.encode() if associated_data else None
+        ciphertext = AESGCM(content_key).encrypt(nonce, message.encode(), aad)
+        
+        return b64encode(nonce + ciphertext).decode('utf-8')
+    except Exception as e:
+        print(f"Error encrypting message: {e}")
+        return None
+
+def decrypt_with_content_key(content_key, encrypted_message, associated_data=None):
+    """Decrypt an AES-GCM encrypted message with its symmetric key"""
+    try:
+        decoded = b64decode(encrypted_message)
+        aad = associated_data.encode() if associated_data else None
+        plaintext = AESGCM(content_key).decrypt(decoded[:12], decoded[12:], aad)
+        
+        return plaintext.decode('utf-8')
+    except Exception as e:
+        print(f"Error decrypting message: {e}")
+        return None
+
+def wrap_content_key(public_key_pem, content_key):
+    """Encrypt a symmetric key with a recipient's public key"""
+    try:
+        public_key = load_public_key(public_key_pem)
+        
+        wrapped_key = public_key.encrypt(
+            content_key,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+        
+        return b64encode(wrapped_key).decode('utf-8')
+    except Exception as e:
+        print(f"Error wrapping key: {e}")
+        return None
+
+def unwrap_content_key(private_key_pem, wrapped_key):
+    """Decrypt a symmetric key with the recipient's private key"""
+    try:
+        private_key = load_private_key(private_key_pem)
+        
+        return private_key.decrypt(
+            b64decode(wrapped_key),
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+    except Exception as e:
+        print(f"Error unwrapping key: {e}")
+        return None
@@ -1,14 +1,33 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages as django_messages
+from django.db import transaction
 from django.db.models import Q
-from .models import Conversation, ConversationParticipant, Message, EncryptedMessageContent
-from users.models import CustomUser, UserKey, UserBlock
-from .forms import MessageForm, CreateGroupForm
+from .models import Conversation, ConversationParticipant, Message, MediaUpload
+from users.models import CustomUser, UserKey
+from users.blocks import blocked_user_ids, is_blocked_between
+from users.media_access import invalidate_media_access
+from .forms import MessageForm, CreateGroupForm, detect_media_type
 from friends.models import Notification
-from django.conf import settings
-from cryptography.fernet import Fernet
-from users.models import UserBlock
+from friends.friendships import friends_of
+from friends.notifications import notify
+from users.counters import get_unread_notification_count, invalidate_notification_counts
+from .media import MEDIA_PAGE_IMAGE_WIDTH, schedule_media_processing
+from .conversation_keys import ConversationKeyUnavailable
+from .display import get_signing_keys, message_display_data, message_delta
+from .realtime import can_view_conversation, conversation_group, publish_new_message, wait_for_group_event
+from .uploads import UPLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE, UploadOffsetError, append_chunk, open_assembled_file, discard_part, part_path
 
 @login_required
 def conversation_list(request):
@@ -25,21 +44,13 @@ def conversation_list(request):
             other_user = conversation.get_other_participant(request.user)
             
             # Skip conversations with blocked users
-            if other_user and UserBlock.objects.filter(
-                (Q(blocker=request.user) & Q(blocked_user=other_user)) |
-                (Q(blocker=other_user) & Q(blocked_user=request.user))
-            ).exists():
+            if other_user and is_blocked_between(request.user, other_user.id):
                 continue
         
         # For group conversations, check if any participant is blocked
         elif conversation.conversation_type == 'group':
             other_participants = conversation.participants.exclude(user=request.user).values_list('user', flat=True)
-            blocked_users = UserBlock.objects.filter(
-                (Q(blocker=request.user) & Q(blocked_user__in=other_participants)) |
-                (Q(blocker__in=other_participants) & Q(blocked_user=request.user))
-            ).exists()
-            
-            if blocked_users:
+            if blocked_user_ids(request.user).intersection(other_participants):
                 continue
         
         # Get the last message for this conversation
@@ -70,10 +81,7 @@ def start_conversation(request, user_id):
     other_user = get_object_or_404(CustomUser, id=user_id)
 
     # Check for blocks
-    if UserBlock.objects.filter(
-        (Q(blocker=request.user) & Q(blocked_user=other_user)) |
-        (Q(blocker=other_user) & Q(blocked_user=request.user))
-    ).exists():
+    if is_blocked_between(request.user, other_user.id):
         django_messages.error(request, "You cannot start a conversation with this user.")
         return redirect('conversation_list')
     
@@ -103,6 +111,90 @@ def start_conversation(request, user_id):
     
     return redirect('view_conversation', conversation_id=conversation.id)
 
+def _send_message(request, conversation, participants, content, media_file=None, media_type='none', is_encrypted=False):
+    """Save a new message with its notifications and queue delivery and media processing"""
+    # Get signing private key
+    signing_private_key = request.session.get('signing_private_key')
+    
+    # Save the message, its keys and notifications together
+    with transaction.atomic():
+        # Create message
+        message = Message(
+            conversation=conversation,
+            sender=request.user,
+            media_type=media_type if media_file else 'none',
+            is_encrypted=is_encrypted
+        )
+        
+        # For media messages, we don't use E2E encryption
+        if media_file:
+            message.is_encrypted = False
+            
+        # Add content if provided
+        if content:
+            # For E2E encryption
+            if message.is_encrypted:
+                # Encrypt content once with the conversation's symmetric key
+                from messaging.conversation_keys import get_sending_key
+                from messaging.utils import encrypt_with_content_key
+                key_version, conversation_key = get_sending_key(request.session, request.user, conversation)
+                message.key_version = key_version
+                message.e2e_content = encrypt_with_content_key(conversation_key, content, str(message.id))
+                
+                # Sign content if private key available
+                if signing_private_key:
+                    from messaging.utils import sign_message
+                    signature = sign_message(signing_private_key, content)
+                    if signature:
+                        message.signature = signature
+                    
+            else:
+                # Standard encryption
+                message.encrypt_message(content)
+                
+                # Sign with private key if available
+                if signing_private_key:
+                    from messaging.utils import sign_message
+                    signature = sign_message(signing_private_key, content)
+                    if signature:
+                        message.signature = signature
+        
+        # Add media if provided
+        if media_file:
+            message.media_file = media_file
+        
+        # Verify the signature once at send time and store the result
+        if content and message.signature:
+            message.verify_signature(content, commit=False)
+        
+        message.save()
+        
+        # Notify other participants in the background, folding into their unread notification
+        notification_content = "New message from {0}".format(request.user.username)
+        if message.is_media_message:
+            notification_content = "{0} sent a {1}".format(
+                request.user.username, 
+                "photo" if message.is_image else "video"
+            )
+        
+        notify(
+            [participant.user_id for participant in participants],
+            'message',
+            notification_content,
+            related_user=request.user,
+            conversation=conversation,
+            coalesce=True
+        )
+    
+        # Push the new message to connected clients once it is committed
+        transaction.on_commit(lambda: publish_new_message(message))
+        
+        # Resize and strip image attachments outside the request
+        if message.is_image and message.media_file:
+            transaction.on_commit(lambda: schedule_media_processing(message.id))
+
+    return message
+
 @login_required
 def view_conversation(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id)
@@ -114,97 +206,9 @@ def view_conversation(request, conversation_id):
     participants = conversation.participants.exclude(user=request.user)
     
     # Check if any participant has blocked the user or if the user has blocked any participant
-    for p in participants:
-        if UserBlock.objects.filter(
-            (Q(blocker=request.user) & Q(blocked_user=p.user)) |
-            (Q(blocker=p.user) & Q(blocked_user=request.user))
-        ).exists():
-            django_messages.error(request, "You cannot view this conversation due to a user block.")
-            return redirect('conversation_list')
-    
-    # Mark messages as read
-    Message.objects.filter(
-        conversation=conversation,
-        is_read=False
-    ).exclude(sender=request.user).update(is_read=True)
-    
-    # Get messages
-    messages_qs = Message.objects.filter(conversation=conversation).order_by('created_at')
-    
-    # Get user's encryption private key from session (temporary for demo)
-    encryption_private_key = request.session.get('encryption_private_key')
-    
-    # Check if user has active keys
-    has_keys = UserKey.objects.filter(user=request.user, is_active=True).exists()
-    
-    # Decrypt messages and prepare for display
-    messages_list = []
-    key = settings.ENCRYPTION_KEY.encode()
-    f = Fernet(key)
-    
-    for msg in messages_qs:
-        message_data = {
-            'id': msg.id,
-            'sender': msg.sender,
-            'created_at': msg.created_at,
-            'is_mine': msg.sender == request.user,
-            'is_media': msg.is_media_message,
-            'media_type': msg.media_type,
-            'media_url': msg.media_file.url if msg.media_file else None,
-            'blockchain_verified': msg.integrity_verified
-        }
-        
-        # Handle standard encrypted messages
-        if not msg.is_encrypted and msg.encrypted_content:
-            try:
-                message_data['content'] = f.decrypt(msg.encrypted_content.encode()).decode()
-            except Exception as e:
-                message_data['content'] = "[Encrypted message]"
-                
-        # Handle E2E encrypted messages
-        elif msg.is_encrypted:
-            if encryption_private_key:
-                try:
-                    # Get the message content encrypted for this user
-                    encrypted_content = msg.encrypted_contents.get(recipient=request.user)
-                    
-                    # Decrypt with user's private key
-                    from messaging.utils import decrypt_message
-                    decrypted_content = decrypt_message(
-                        encryption_private_key,
-                        encrypted_content.encrypted_content
-                    )
-                    
-                    if decrypted_content:
-                        message_data['content'] = decrypted_content
-                    else:
-                        message_data['content'] = "[Could not decrypt message]"
-                except Exception as e:
-                    message_data['content'] = "[End-to-end encrypted message - Error decrypting]"
-            else:
-                message_data['content'] = "[End-to-end encrypted message - No private key available]"
-        else:
-            message_data['content'] = ""
-        
-        # Check signature if present
-        if msg.signature and not msg.is_mine:
-            # Get sender's signing public key
-            try:
-                signing_key = UserKey.objects.get(user=msg.sender, key_type='signing', is_active=True)
-                
-                # Verify signature
-                from messaging.utils import verify_signature
-                is_verified = verify_signature(
-                    signing_key.public_key,
-                    message_data['content'],
-                    msg.signature
-                )
-                
-                message_data['signature_verified'] = is_verified
-            except UserKey.DoesNotExist:
-                message_data['signature_verified'] = False
-        
-        messages_list.append(message_data)
+    if blocked_user_ids(request.user).intersection(p.user_id for p in participants):
+        django_messages.error(request, "You cannot view this conversation due to a user block.")
+        return redirect('conversation_list')
     
     # Handle message form
     form = MessageForm()
@@ -220,116 +224,54 @@ def view_conversation(request, conversation_id):
                 django_messages.warning(request, "You need to verify your account to send media.")
                 return redirect('verification_request')
             
-            # Get signing private key
-            signing_private_key = request.session.get('signing_private_key')
-            
-            # Create message
-            message = Message(
-                conversation=conversation,
-                sender=request.user,
-                media_type=media_type if media_file else 'none',
-                is_encrypted=form.cleaned_data.get('enable_e2e', False)
-            )
-            
-            # For media messages, we don't use E2E encryption
-            if media_file:
-                message.is_encrypted = False
-                
-            # Add content if provided
-            if content:
-                # For E2E encryption
-                if message.is_encrypted:
-                    # Create the message without standard encryption
-                    message.save()
-                    
-                    # Encrypt with each recipient's public key
-                    for participant in participants:
-                        try:
-                            # Get recipient's encryption public key
-                            encryption_key = UserKey.objects.get(
-                                user=participant.user, 
-                                key_type='encryption',
-                                is_active=True
-                            )
-                            
-                            # Sign content if private key available
-                            signed_content = content
-                            if signing_private_key:
-                                from messaging.utils import sign_message
-                                signature = sign_message(signing_private_key, content)
-                                if signature:
-                                    message.signature = signature
-                            
-                            # Encrypt content for this recipient
-                            from messaging.utils import encrypt_for_recipient
-                            encrypted = encrypt_for_recipient(encryption_key.public_key, content)
-                            
-                            if encrypted:
-                                # Store encrypted content for this recipient
-                                EncryptedMessageContent.objects.create(
-                                    message=message,
-                                    recipient=participant.user,
-                                    encrypted_content=encrypted
-                                )
-                        except UserKey.DoesNotExist:
-                            # Skip recipients without encryption keys
-                            pass
-                    
-                    # Also encrypt for the sender (so they can see their own messages)
-                    try:
-                        sender_key = UserKey.objects.get(
-                            user=request.user, 
-                            key_type='encryption',
-                            is_active=True
-                        )
-                        
-                        from messaging.utils import encrypt_for_recipient
-                        encrypted = encrypt_for_recipient(sender_key.public_key, content)
-                        
-                        if encrypted:
-                            EncryptedMessageContent.objects.create(
-                                message=message,
-                                recipient=request.user,
-                                encrypted_content=encrypted
-                            )
-                    except UserKey.DoesNotExist:
-                        pass
-                        
-                else:
-                    # Standard encryption
-                    message.encrypt_message(content)
-                    
-                    # Sign with private key if available
-                    if signing_private_key:
-                        from messaging.utils import sign_message
-                        signature = sign_message(signing_private_key, content)
-                        if signature:
-                            message.signature = signature
-            
-            # Add media if provided
-            if media_file:
-                message.media_file = media_file
-            
-            message.save()
-            
-            # Create notifications for other participants
-            for participant in participants:
-                notification_content = "New message from {0}".format(request.user.username)
-                if message.is_media_message:
-                    notification_content = "{0} sent a {1}".format(
-                        request.user.username, 
-                        "photo" if message.is_image else "video"
-                    )
-                
-                Notification.objects.create(
-                    user=participant.user,
-                    notification_type='message',
-                    content=notification_content,
-                    related_user=request.user
+            try:
+                message = _send_message(
+                    request, conversation, participants, content, media_file, media_type,
+                    form.cleaned_data.get('enable_e2e', False)
                 )
+            except ConversationKeyUnavailable:
+                error = "Load your private keys to send end-to-end encrypted messages in this conversation."
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'status': 'error', 'error': error}, status=409)
+                django_messages.error(request, error)
+                return redirect('view_conversation', conversation_id=conversation.id)
             
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'success', 'message_id': str(message.id)})
             return redirect('view_conversation', conversation_id=conversation.id)
+        
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
 
+    # Mark messages as read
+    Message.objects.filter(
+        conversation=conversation,
+        is_read=False
+    ).exclude(sender=request.user).update(is_read=True)
+    if Notification.objects.filter(
+        user=request.user,
+        notification_type='message',
+        conversation=conversation,
+        is_read=False
+    ).update(is_read=True):
+        invalidate_notification_counts([request.user.id])
+    
+    # Get messages
+    messages_qs = Message.objects.filter(conversation=conversation).select_related('sender').order_by('created_at')
+    
+    # Get user's encryption private key from session (temporary for demo)
+    encryption_private_key = request.session.get('encryption_private_key')
+    
+    # Check if user has active keys
+    has_keys = UserKey.objects.filter(user=request.user, is_active=True).exists()
+    
+    # Decrypt messages and prepare for display
+    signing_keys = get_signing_keys(messages_qs.values('sender_id'))
+    messages_list = [
+        message_display_data(msg, request.user, request.session, signing_keys)
+        for msg in messages_qs
+    ]
+    
     if request.user.is_staff and request.GET.get('verify_integrity') == '1':
         from .blockchain import validate_conversation_integrity
         integrity_results = validate_conversation_integrity(conversation_id)
@@ -381,19 +323,20 @@ def create_group(request):
             )
             
             # Add other participants
-            for user in form.cleaned_data['participants']:
-                ConversationParticipant.objects.create(
-                    conversation=conversation,
-                    user=user
-                )
-                
-                # Notify participants
-                Notification.objects.create(
-                    user=user,
-                    notification_type='group_invite',
-                    content=f"{request.user.username} added you to the group '{conversation.name}'",
-                    related_user=request.user
-                )
+            members = list(form.cleaned_data['participants'])
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(conversation=conversation, user=user)
+                for user in members
+            ])
+            
+            # Notify participants
+            notify(
+                [user.id for user in members],
+                'group_invite',
+                f"{request.user.username} added you to the group '{conversation.name}'",
+                related_user=request.user,
+                conversation=conversation
+            )
             
             django_messages.success(request, f"Group '{conversation.name}' created successfully.")
             return redirect('view_conversation', conversation_id=conversation.id)
@@ -461,11 +404,12 @@ def leave_group(request, conversation_id):
             new_admin.save()
             
             # Notify the new admin
-            Notification.objects.create(
-                user=new_admin.user,
-                notification_type='group_invite',
-                content=f"You are now an admin of the group '{conversation.name}'",
-                related_user=request.user
+            notify(
+                [new_admin.user_id],
+                'group_invite',
+                f"You are now an admin of the group '{conversation.name}'",
+                related_user=request.user,
+                conversation=conversation
             )
     
     # Remove the participant
@@ -487,18 +431,17 @@ def delete_group(request, conversation_id):
     )
     
     # Get all participants to notify them
-    participants = ConversationParticipant.objects.filter(
+    participant_ids = ConversationParticipant.objects.filter(
         conversation=conversation
-    ).exclude(user=request.user)
-    
-    # Notify all participants
-    for participant in participants:
-        Notification.objects.create(
-            user=participant.user,
-            notification_type='group_invite',
-            content=f"The group '{conversation.name}' has been deleted by {request.user.username}",
-            related_user=request.user
-        )
+    ).exclude(user=request.user).values_list('user_id', flat=True)
+    
+    # Notify all participants (not linked to the conversation, which is being deleted)
+    notify(
+        participant_ids,
+        'group_invite',
+        f"The group '{conversation.name}' has been deleted by {request.user.username}",
+        related_user=request.user
+    )
     
     # Delete the conversation (this will cascade delete all messages and participants)
     conversation_name = conversation.name
@@ -526,9 +469,123 @@ def view_media(request, message_id):
     
     return render(request, 'messaging/view_media.html', {
         'message': message,
-        'conversation': message.conversation
+        'conversation': message.conversation,
+        'display_url': message.media_display_url(MEDIA_PAGE_IMAGE_WIDTH) if message.is_image else None
     })
 
+def _upload_status(upload):
+    return {
+        'upload_id': str(upload.id),
+        'offset': upload.received_size,
+        'total_size': upload.total_size,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+        'status': upload.status,
+    }
+
+@login_required
+def start_media_upload(request, conversation_id):
+    """Begin a chunked upload for a large attachment"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'error': 'POST required'}, status=405)
+    
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    if not can_view_conversation(request.user, conversation.id):
+        return JsonResponse({'status': 'error', 'error': 'Conversation not found'}, status=404)
+    
+    # Same rule as the message form
+    if not request.user.is_verified:
+        return JsonResponse({'status': 'error', 'error': 'You need to verify your account to send media.'}, status=403)
+    
+    filename = os.path.basename(request.POST.get('filename', ''))[:255]
+    content_type = request.POST.get('content_type', '')[:100]
+    try:
+        total_size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'error': 'Invalid size'}, status=400)
+    
+    media_type = detect_media_type(content_type, filename)
+    if not filename or not media_type:
+        return JsonResponse({'status': 'error', 'error': 'Unsupported file type. Only images and videos are allowed.'}, status=400)
+    if total_size <= 0 or total_size > MAX_UPLOAD_SIZE:
+        return JsonResponse({'status': 'error', 'error': 'File is empty or too large.'}, status=400)
+    
+    upload = MediaUpload.objects.create(
+        user=request.user,
+        conversation=conversation,
+        filename=filename,
+        content_type=content_type,
+        media_type=media_type,
+        total_size=total_size
+    )
+    return JsonResponse(_upload_status(upload), status=201)
+
+@login_required
+def media_upload_chunk(request, upload_id):
+    """GET returns the resume offset; PUT/POST appends the request body at the Upload-Offset header"""
+    upload = get_object_or_404(MediaUpload, id=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(_upload_status(upload))
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'status': 'error', 'error': 'PUT required'}, status=405)
+    if upload.status != 'uploading':
+        return JsonResponse(_upload_status(upload), status=409)
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'error': 'Upload-Offset header required'}, status=400)
+    
+    try:
+        append_chunk(upload, request, offset)
+    except UploadOffsetError:
+        return JsonResponse(_upload_status(upload), status=409)
+    
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+def complete_media_upload(request, upload_id):
+    """Attach a fully received upload to a new message"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'error': 'POST required'}, status=405)
+    
+    upload = get_object_or_404(MediaUpload, id=upload_id, user=request.user, status='uploading')
+    if upload.received_size != upload.total_size:
+        return JsonResponse(_upload_status(upload), status=409)
+    
+    conversation = upload.conversation
+    if not can_view_conversation(request.user, conversation.id):
+        return JsonResponse({'status': 'error', 'error': 'Conversation not found'}, status=404)
+    
+    participants = conversation.participants.exclude(user=request.user)
+    try:
+        with transaction.atomic():
+            # Claim the upload so a repeated or concurrent request cannot create a second message
+            if not MediaUpload.objects.filter(pk=upload.pk, status='uploading').update(status='complete'):
+                upload.refresh_from_db()
+                return JsonResponse(_upload_status(upload), status=409)
+            
+            media_file = open_assembled_file(upload)
+            try:
+                message = _send_message(
+                    request, conversation, participants,
+                    request.POST.get('content', ''), media_file, upload.media_type
+                )
+            finally:
+                media_file.close()
+            
+            upload.status = 'complete'
+            upload.message = message
+            upload.save(update_fields=['status', 'message', 'updated_at'])
+            transaction.on_commit(lambda: discard_part(upload))
+    except Exception:
+        # Storage may have moved the part file into place before the rollback;
+        # without it the upload cannot be completed, so don't leave it resumable
+        if not os.path.exists(part_path(upload)):
+            MediaUpload.objects.filter(pk=upload.pk).update(status='failed')
+        raise
+    
+    return JsonResponse({'status': 'success', 'message_id': str(message.id)})
+
 @login_required
 def manage_group_members(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id, conversation_type='group')
@@ -554,23 +611,8 @@ def manage_group_members(request, conversation_id):
             # Get friend IDs from form
             friend_ids = request.POST.getlist('friends')
             if friend_ids:
-                # Get friend users
-                from friends.models import FriendRequest
-                from django.db.models import Q
-                
-                # Get user's verified friends
-                friends_1 = FriendRequest.objects.filter(
-                    sender=request.user,
-                    status='accepted'
-                ).values_list('receiver', flat=True)
-                
-                friends_2 = FriendRequest.objects.filter(
-                    receiver=request.user,
-                    status='accepted'
-                ).values_list('sender', flat=True)
-                
-                friends = CustomUser.objects.filter(
-                    Q(id__in=friends_1) | Q(id__in=friends_2),
+                # Get user's verified friends among the selected users
+                friends = friends_of(request.user).filter(
                     id__in=friend_ids,
                     is_verified=True
                 )
@@ -578,28 +620,26 @@ def manage_group_members(request, conversation_id):
                 # Get current participant user IDs
                 current_participant_ids = current_participants.values_list('user__id', flat=True)
                 
-                # Add new members
-                added_count = 0
-                for friend in friends:
-                    # Skip if already in group
-                    if friend.id in current_participant_ids:
-                        continue
-                        
-                    # Add to group
-                    ConversationParticipant.objects.create(
-                        conversation=conversation,
-                        user=friend
-                    )
-                    
-                    # Notify the user
-                    Notification.objects.create(
-                        user=friend,
-                        notification_type='group_invite',
-                        content=f"{request.user.username} added you to the group '{conversation.name}'",
-                        related_user=request.user
-                    )
-                    
-                    added_count += 1
+                # Add new members, skipping anyone already in the group
+                current_participant_ids = set(current_participant_ids)
+                new_members = [friend for friend in friends if friend.id not in current_participant_ids]
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation=conversation, user=friend)
+                    for friend in new_members
+                ])
+                # bulk_create skips the post_save signal
+                invalidate_media_access(*[friend.id for friend in new_members])
+                
+                # Notify the new members
+                notify(
+                    [friend.id for friend in new_members],
+                    'group_invite',
+                    f"{request.user.username} added you to the group '{conversation.name}'",
+                    related_user=request.user,
+                    conversation=conversation
+                )
+                
+                added_count = len(new_members)
                 
                 if added_count > 0:
                     django_messages.success(request, f"Added {added_count} new members to the group.")
@@ -620,36 +660,22 @@ def manage_group_members(request, conversation_id):
                 participant.save()
                 
                 # Notify the user
-                Notification.objects.create(
-                    user=participant.user,
-                    notification_type='group_invite',
-                    content=f"You are now an admin of the group '{conversation.name}'",
-                    related_user=request.user
+                notify(
+                    [participant.user_id],
+                    'group_invite',
+                    f"You are now an admin of the group '{conversation.name}'",
+                    related_user=request.user,
+                    conversation=conversation
                 )
                 
                 django_messages.success(request, f"{participant.user.username} is now an admin of this group.")
                 return redirect('manage_group_members', conversation_id=conversation.id)
     
     # Get potential friends to add (friends who aren't already in the group)
-    from friends.models import FriendRequest
-    from django.db.models import Q
-    
-    # Get current participant user IDs
     current_participant_ids = current_participants.values_list('user__id', flat=True)
     
     # Get user's verified friends
-    friends_1 = FriendRequest.objects.filter(
-        sender=request.user,
-        status='accepted'
-    ).values_list('receiver', flat=True)
-    
-    friends_2 = FriendRequest.objects.filter(
-        receiver=request.user,
-        status='accepted'
-    ).values_list('sender', flat=True)
-    
-    available_friends = CustomUser.objects.filter(
-        Q(id__in=friends_1) | Q(id__in=friends_2),
+    available_friends = friends_of(request.user).filter(
         is_verified=True
     ).exclude(id__in=current_participant_ids)
     
@@ -659,4 +685,166 @@ def manage_group_members(request, conversation_id):
         'available_friends': available_friends
     }
     
-    return render(request, 'messaging/manage_group_members.html', context)
\ No newline at end of file
+    return render(request, 'messaging/manage_group_members.html', context)
+
+# Server-Sent Events / long-poll endpoints. These are async views, so a waiting
+# client does not hold a worker thread between polls.
+EVENT_STREAM_DURATION = 55  # seconds; EventSource reconnects with Last-Event-ID
+EVENT_POLL_INTERVAL = 5  # seconds between checks when no push arrives
+LONG_POLL_TIMEOUT = 25  # seconds
+
+def _sse_event(event, data, event_id=None):
+    payload = f"event: {event}\n"
+    if event_id is not None:
+        payload += f"id: {event_id}\n"
+    payload += f"data: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+    return payload
+
+def _event_cursor(request, parse_id):
+    """
+    Return (timestamp, id) from ?since= or Last-Event-ID, or (now, None) for a new client.
+    Cursors are "<iso timestamp>|<id>" so rows sharing a timestamp are not skipped.
+    """
+    timestamp, _, last_id = (request.GET.get('since') or request.headers.get('Last-Event-ID') or '').partition('|')
+    timestamp = parse_datetime(timestamp) or timezone.now()
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    try:
+        last_id = parse_id(last_id)
+    except ValueError:
+        last_id = None
+    return timestamp, last_id
+
+def _format_cursor(cursor):
+    timestamp, last_id = cursor
+    return f"{timestamp.isoformat()}|{last_id}" if last_id is not None else timestamp.isoformat()
+
+def _after_cursor(field, cursor):
+    """Filter for rows strictly after (timestamp, id) in (field, id) order"""
+    timestamp, last_id = cursor
+    if last_id is None:
+        return Q(**{f"{field}__gt": timestamp})
+    return Q(**{f"{field}__gt": timestamp}) | Q(**{field: timestamp, 'id__gt': last_id})
+
+def _messages_since(user, session, conversation_id, cursor):
+    """Return (cursor, deltas) for messages created after cursor"""
+    new_messages = list(Message.objects.filter(
+        _after_cursor('created_at', cursor),
+        conversation_id=conversation_id
+    ).select_related('sender').order_by('created_at', 'id')[:100])
+    if not new_messages:
+        return cursor, []
+    
+    Message.objects.filter(
+        pk__in=[msg.pk for msg in new_messages if msg.sender_id != user.id],
+        is_read=False
+    ).update(is_read=True)
+    
+    signing_keys = get_signing_keys({msg.sender_id for msg in new_messages})
+    deltas = [
+        message_delta(message_display_data(msg, user, session, signing_keys))
+        for msg in new_messages
+    ]
+    if session.modified:
+        session.save()
+    return (new_messages[-1].created_at, new_messages[-1].id), deltas
+
+def _notifications_since(user, cursor):
+    """Return (cursor, new or updated notifications, unread count) for notifications after cursor"""
+    # Coalesced notifications are updated in place, so follow last_at rather than the id
+    new_notifications = list(Notification.objects.filter(
+        _after_cursor('last_at', cursor),
+        user=user
+    ).order_by('last_at', 'id').values('id', 'notification_type', 'content', 'count', 'is_read', 'created_at', 'last_at')[:100])
+    if new_notifications:
+        cursor = (new_notifications[-1]['last_at'], new_notifications[-1]['id'])
+    unread_count = get_unread_notification_count(user.id)
+    return cursor, new_notifications, unread_count
+
+async def conversation_events(request, conversation_id):
+    """Stream new messages of a conversation (SSE), or wait for them once with ?mode=poll"""
+    user = await sync_to_async(get_user)(request)
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'error', 'error': 'Authentication required'}, status=401)
+    check_access = sync_to_async(can_view_conversation)
+    if not await check_access(user, conversation_id):
+        return JsonResponse({'status': 'error', 'error': 'Not allowed'}, status=403)
+    
+    cursor = _event_cursor(request, uuid.UUID)
+    group_name = conversation_group(conversation_id)
+    messages_since = sync_to_async(_messages_since)
+    
+    if request.GET.get('mode') == 'poll':
+        deadline = time.monotonic() + LONG_POLL_TIMEOUT
+        while True:
+            # Membership and blocks can change while the client waits
+            if not await check_access(user, conversation_id):
+                return JsonResponse({'status': 'error', 'error': 'Not allowed'}, status=403)
+            cursor, deltas = await messages_since(user, request.session, conversation_id, cursor)
+            remaining = deadline - time.monotonic()
+            if deltas or remaining <= 0:
+                return JsonResponse({'cursor': _format_cursor(cursor), 'messages': deltas})
+            await wait_for_group_event(group_name, min(EVENT_POLL_INTERVAL, remaining))
+    
+    async def stream():
+        nonlocal cursor
+        deadline = time.monotonic() + EVENT_STREAM_DURATION
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            if not await check_access(user, conversation_id):
+                yield _sse_event('revoked', {'conversation_id': str(conversation_id)})
+                return
+            cursor, deltas = await messages_since(user, request.session, conversation_id, cursor)
+            for delta in deltas:
+                yield _sse_event('message', delta, event_id=f"{delta['created_at']}|{delta['id']}")
+            if not deltas:
+                yield ": keepalive\n\n"
+            await wait_for_group_event(group_name, EVENT_POLL_INTERVAL)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def notification_events(request):
+    """Stream new notifications and the unread count (SSE), or wait for them once with ?mode=poll"""
+    user = await sync_to_async(get_user)(request)
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'error', 'error': 'Authentication required'}, status=401)
+    
+    cursor = _event_cursor(request, int)
+    notifications_since = sync_to_async(_notifications_since)
+    
+    if request.GET.get('mode') == 'poll':
+        deadline = time.monotonic() + LONG_POLL_TIMEOUT
+        while True:
+            cursor, new_notifications, unread_count = await notifications_since(user, cursor)
+            if new_notifications or time.monotonic() >= deadline:
+                return JsonResponse({
+                    'cursor': _format_cursor(cursor),
+                    'unread_count': unread_count,
+                    'notifications': new_notifications
+                })
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+    
+    async def stream():
+        nonlocal cursor
+        deadline = time.monotonic() + EVENT_STREAM_DURATION
+        last_unread_count = None
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            cursor, new_notifications, unread_count = await notifications_since(user, cursor)
+            if new_notifications or unread_count != last_unread_count:
+                last_unread_count = unread_count
+                yield _sse_event('notifications', {
+                    'unread_count': unread_count,
+                    'notifications': new_notifications
+                }, event_id=_format_cursor(cursor))
+            else:
+                yield ": keepalive\n\n"
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
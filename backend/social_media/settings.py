@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'messaging',
     'marketplace',
     'captcha',
+    'channels',
 ]
 
 MIDDLEWARE = [
@@ -71,8 +72,34 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'social_media.wsgi.application'
+ASGI_APPLICATION = 'social_media.asgi.application'
 
 load_dotenv()  # Load environment variables
+
+# Real-time fan-out for WebSocket clients. The in-memory layer only reaches clients
+# connected to the same process, so set REDIS_URL when running more than one worker.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+    }
+
+# Shared cache so cached decisions (e.g. protected media access) are seen by every worker
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -110,12 +137,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/protected-media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Hand protected media to nginx via X-Accel-Redirect after the permission check.
+# MEDIA_ACCEL_PREFIX must match the internal location in nginx/default.conf.
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "False") == "True"
+MEDIA_ACCEL_PREFIX = '/internal-media/'
+# Partial chunked uploads, kept outside MEDIA_ROOT so they are never served
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_tmp')
 
 # Auth user model
 AUTH_USER_MODEL = 'users.CustomUser'
 
 # Encryption key for message encryption (generate a secure key for production)
 ENCRYPTION_KEY =os.getenv("ENCRYPTION_KEY")
+# Previous encryption keys (comma separated) still accepted for decryption after a key rotation.
+# Run `python manage.py reencrypt_messages` to move old messages to ENCRYPTION_KEY.
+ENCRYPTION_OLD_KEYS = [key.strip() for key in os.getenv("ENCRYPTION_OLD_KEYS", "").split(",") if key.strip()]
 # Login URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'profile'
@@ -1,13 +1,143 @@
-from django.http import FileResponse, Http404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse, Http404
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.static import was_modified_since
+from urllib.parse import quote
+from users.media_access import can_access_media
+from users.storage import is_blob_name
+import mimetypes
 import os
+import re
+
+MEDIA_CACHE_CONTROL = 'private, max-age=3600'
+# Content-addressed blobs never change under the same name
+BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _parse_range(header, size):
+    """Return (start, end) for a single byte range, None to serve the whole file, or False if unsatisfiable"""
+    match = range_re.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges, fall back to the full file
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+def _file_range(file_path, start, length):
+    """Stream a byte range of a file in fixed-size chunks"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def _async_file_range(file_path, start, length):
+    """
+    The same chunks as _file_range for ASGI servers, which would otherwise read a
+    sync iterator into memory in one piece before sending it.
+    """
+    chunks = _file_range(file_path, start, length)
+    read_chunk = sync_to_async(next, thread_sensitive=False)
+    while True:
+        chunk = await read_chunk(chunks, None)
+        if chunk is None:
+            break
+        yield chunk
 
 @login_required
 def serve_protected_media(request, path):
-    file_path = os.path.join(settings.MEDIA_ROOT, path)
+    try:
+        file_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
 
-    if not os.path.isfile(file_path):
+    # Unknown paths and files the user may not see look the same
+    if not can_access_media(request.user, path) or not os.path.isfile(file_path):
         raise Http404("File not found")
 
-    return FileResponse(open(file_path, 'rb'))
+    content_type, encoding = mimetypes.guess_type(file_path)
+    content_type = content_type or 'application/octet-stream'
+    cache_control = BLOB_CACHE_CONTROL if is_blob_name(path) else MEDIA_CACHE_CONTROL
+
+    # Let nginx stream the file (with range and caching support) once access is checked
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        response['Cache-Control'] = cache_control
+        return response
+
+    stat = os.stat(file_path)
+    size = stat.st_size
+    etag = quote_etag(f"{int(stat.st_mtime):x}-{size:x}")
+    last_modified = http_date(stat.st_mtime)
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        if etag in parse_etags(if_none_match) or if_none_match.strip() == '*':
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = cache_control
+            return response
+    elif not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # Only honour the range if the client's copy is still current
+    if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        status = 206
+    else:
+        start, end = 0, size - 1
+        status = 200
+    length = end - start + 1
+    file_range = _async_file_range if isinstance(request, ASGIRequest) else _file_range
+    response = StreamingHttpResponse(file_range(file_path, start, length), status=status, content_type=content_type)
+    if byte_range:
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = cache_control
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
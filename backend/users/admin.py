@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, OTP, UserKey, UserFollow, UserBlock, PasswordResetRequest
+from .models import CustomUser, OTP, UserKey, UserFollow, UserBlock, PasswordResetRequest, MediaAsset
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'phone_number', 'is_verified', 'verification_status', 'date_joined')
@@ -17,4 +17,5 @@ admin.site.register(OTP)
 admin.site.register(UserKey)
 admin.site.register(UserFollow)
 admin.site.register(UserBlock)
-admin.site.register(PasswordResetRequest)
\ No newline at end of file
+admin.site.register(PasswordResetRequest)
+admin.site.register(MediaAsset)
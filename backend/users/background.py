@@ -0,0 +1,24 @@
+# users/background.py
+import logging
+import time
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+LOCK_RETRY_ATTEMPTS = 4
+LOCK_RETRY_DELAY = 0.25
+
+def retry_on_lock(func, *args, **kwargs):
+    """
+    Call func, retrying with backoff when the database raises OperationalError
+    (on SQLite, "database is locked" while another connection holds the write lock).
+    func must be safe to run again, e.g. one transaction that rolls back as a whole.
+    """
+    for attempt in range(LOCK_RETRY_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if attempt == LOCK_RETRY_ATTEMPTS - 1:
+                raise
+            logger.warning(f"Retrying {func.__name__} after database error: {e}")
+            time.sleep(LOCK_RETRY_DELAY * 2 ** attempt)
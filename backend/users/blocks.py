@@ -0,0 +1,72 @@
+# users/blocks.py
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Q
+from .models import UserBlock
+
+# Writes invalidate the cached sets; the TTL only bounds staleness if an invalidation is lost
+BLOCK_CACHE_TTL = 300
+
+def _cache_key(user_id):
+    return f"user_blocks:{user_id}"
+
+def _cache_is_shared():
+    """
+    A per-process cache would keep a new block invisible to the other workers,
+    so block sets are only cached across requests in a shared cache (REDIS_URL).
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+def get_blocks(user):
+    """
+    Return (blocking, blocked_by): ids the user has blocked and ids that blocked the user.
+    Loaded with one query, cached across requests in a shared cache and memoized on the user object.
+    """
+    blocks = getattr(user, '_block_sets', None)
+    if blocks is not None:
+        return blocks
+
+    use_cache = _cache_is_shared()
+    cached = cache.get(_cache_key(user.id)) if use_cache else None
+    if cached is None:
+        blocking, blocked_by = set(), set()
+        for blocker_id, blocked_user_id in UserBlock.objects.filter(
+            Q(blocker_id=user.id) | Q(blocked_user_id=user.id)
+        ).values_list('blocker_id', 'blocked_user_id'):
+            if blocker_id == user.id:
+                blocking.add(blocked_user_id)
+            else:
+                blocked_by.add(blocker_id)
+        cached = (blocking, blocked_by)
+        if use_cache:
+            cache.set(_cache_key(user.id), cached, BLOCK_CACHE_TTL)
+
+    blocks = (frozenset(cached[0]), frozenset(cached[1]))
+    user._block_sets = blocks
+    return blocks
+
+def forget_memoized_blocks(user):
+    """Drop the block sets memoized on a user object that outlives a request"""
+    try:
+        del user._block_sets
+    except AttributeError:
+        pass
+
+def blocked_user_ids(user):
+    """Ids with a block in either direction"""
+    blocking, blocked_by = get_blocks(user)
+    return blocking | blocked_by
+
+def is_blocked_between(user, other_user_id):
+    return other_user_id in blocked_user_ids(user)
+
+def exclude_blocked(queryset, user, field='id'):
+    """Exclude rows whose user field points at someone blocked in either direction"""
+    blocked_ids = blocked_user_ids(user)
+    if not blocked_ids:
+        return queryset
+    return queryset.exclude(**{f"{field}__in": blocked_ids})
+
+def invalidate_blocks(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -1,20 +1,15 @@
-from friends.models import Notification
-from marketplace.models import Cart
+from .counters import get_unread_notification_count, get_cart_item_count
 
 def notification_count(request):
     """Add notification count to the context."""
     count = 0
     if request.user.is_authenticated:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        count = get_unread_notification_count(request.user.id)
     return {'notification_count': count}
 
 def cart_count(request):
     """Add cart item count to the context."""
     count = 0
     if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user)
-            count = cart.total_items
-        except Cart.DoesNotExist:
-            pass
-    return {'cart_item_count': count}
\ No newline at end of file
+        count = get_cart_item_count(request.user.id)
+    return {'cart_item_count': count}
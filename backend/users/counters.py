@@ -0,0 +1,38 @@
+# users/counters.py
+from django.core.cache import cache
+from django.db.models import Sum
+
+# Counters shown on every page. Writes invalidate them; the TTL only bounds staleness
+# when each worker has its own (local memory) cache.
+COUNTER_CACHE_TTL = 300
+
+def _notification_key(user_id):
+    return f"unread_notifications:{user_id}"
+
+def _cart_key(user_id):
+    return f"cart_items:{user_id}"
+
+def get_unread_notification_count(user_id):
+    from friends.models import Notification
+
+    count = cache.get(_notification_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(_notification_key(user_id), count, COUNTER_CACHE_TTL)
+    return count
+
+def invalidate_notification_counts(user_ids):
+    """Call after notification writes that bypass signals (bulk_create, update)"""
+    cache.delete_many([_notification_key(user_id) for user_id in user_ids])
+
+def get_cart_item_count(user_id):
+    from marketplace.models import CartItem
+
+    count = cache.get(_cart_key(user_id))
+    if count is None:
+        count = CartItem.objects.filter(cart__user_id=user_id).aggregate(total=Sum('quantity'))['total'] or 0
+        cache.set(_cart_key(user_id), count, COUNTER_CACHE_TTL)
+    return count
+
+def invalidate_cart_count(user_id):
+    cache.delete(_cart_key(user_id))
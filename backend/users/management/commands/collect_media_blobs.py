@@ -0,0 +1,76 @@
+from collections import Counter
+from datetime import timedelta
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from users.models import StoredBlob, MediaAsset
+from users.storage import BLOB_FIELDS, BLOB_PREFIX, ContentAddressedStorage
+
+def _blob_models():
+    return [(apps.get_model(app_label, model_name), field_name) for app_label, model_name, field_name in BLOB_FIELDS]
+
+def _is_referenced(name):
+    return any(model.objects.filter(**{field_name: name}).exists() for model, field_name in _blob_models())
+
+class Command(BaseCommand):
+    help = 'Recount references to deduplicated media blobs and delete unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=1,
+            help='Keep unreferenced blobs younger than this (uploads whose object is not saved yet)'
+        )
+
+    def handle(self, *args, **options):
+        # Read the stored counts before the references, so an upload that adds a
+        # reference in between makes the conditional update below skip that blob
+        stored_counts = list(StoredBlob.objects.values_list('pk', 'name', 'ref_count'))
+
+        # Count live references from every model field stored in blobs
+        references = Counter()
+        for model, field_name in _blob_models():
+            references.update(
+                model.objects.filter(**{f"{field_name}__startswith": BLOB_PREFIX}).values_list(field_name, flat=True)
+            )
+
+        # Correct counts that drifted (replaced files, failed saves), unless they changed meanwhile
+        corrected = 0
+        for pk, name, ref_count in stored_counts:
+            count = references.get(name, 0)
+            if ref_count != count:
+                corrected += StoredBlob.objects.filter(pk=pk, ref_count=ref_count).update(ref_count=count)
+        self.stdout.write(f"Corrected reference counts on {corrected} blobs")
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        garbage = StoredBlob.objects.filter(ref_count=0, created_at__lt=cutoff)
+
+        storage = ContentAddressedStorage()
+        deleted = 0
+        freed = 0
+        for blob in garbage.iterator(chunk_size=500):
+            if options['dry_run']:
+                deleted += 1
+                freed += blob.size
+                continue
+
+            with transaction.atomic():
+                # Only delete the file if the row is still unreferenced when it is removed;
+                # a concurrent upload of the same content re-creates the row and the file
+                if _is_referenced(blob.name):
+                    continue
+                removed, _ = StoredBlob.objects.filter(pk=blob.pk, ref_count=0).delete()
+                if not removed:
+                    continue
+                MediaAsset.objects.filter(path=blob.name).delete()
+                storage.delete(blob.name)
+            deleted += 1
+            freed += blob.size
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {deleted} unreferenced blobs ({freed / (1024 * 1024):.1f} MB)"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from users.models import CustomUser
+from users.search import index_user
+
+class Command(BaseCommand):
+    help = 'Rebuild the user search index (e.g. after changing how search terms are built)'
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for user in CustomUser.objects.only('id', 'username', 'email').iterator(chunk_size=1000):
+            index_user(user)
+            indexed += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} users"))
@@ -0,0 +1,101 @@
+# users/media_access.py
+import hashlib
+import uuid
+from django.core.cache import cache
+from .blocks import _cache_is_shared, blocked_user_ids
+from .models import MediaAsset
+
+# Access decisions are cached briefly; membership and block changes also invalidate them.
+# Like block sets, they are only cached when every worker shares the cache.
+ACCESS_CACHE_TTL = 60
+# A path never changes owner, so index lookups can be cached much longer
+INDEX_CACHE_TTL = 3600
+
+def _path_digest(path):
+    return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+def _index_cache_key(path):
+    return f"media_index:{_path_digest(path)}"
+
+def _generation_key(user_id):
+    return f"media_access_generation:{user_id}"
+
+def _access_cache_key(user_id, generation, path):
+    return f"media_access:{user_id}:{generation}:{_path_digest(path)}"
+
+def invalidate_media_access(*user_ids):
+    """Forget cached access decisions of these users by moving them to a new generation"""
+    cache.set_many({_generation_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+def index_media(path, kind, owner_id=None, object_id=None):
+    """Record who controls access to an uploaded file"""
+    if not path:
+        return
+    _, created = MediaAsset.objects.get_or_create(path=path, kind=kind, owner_id=owner_id, object_id=object_id)
+    if created:
+        # Deduplicated blobs gain owners over time
+        cache.delete(_index_cache_key(path))
+
+def index_media_paths(paths, kind, owner_id=None, object_id=None):
+    """Index several files belonging to one object, e.g. generated image variants"""
+    MediaAsset.objects.bulk_create(
+        [MediaAsset(path=path, kind=kind, owner_id=owner_id, object_id=object_id) for path in paths if path]
+    )
+
+def index_field_file(instance, field_name, kind, owner_id, object_id=None, update_fields=None):
+    """post_save helper: index a model's file field when it may have changed"""
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    if field_file:
+        index_media(field_file.name, kind, owner_id, object_id)
+
+def get_media_assets(path):
+    """Return [(kind, owner_id, object_id), ...] for every object using the file at path"""
+    use_cache = _cache_is_shared()
+    cache_key = _index_cache_key(path)
+    assets = cache.get(cache_key) if use_cache else None
+    if assets is None:
+        assets = [tuple(asset) for asset in MediaAsset.objects.filter(path=path).values_list('kind', 'owner_id', 'object_id')]
+        if assets and use_cache:
+            cache.set(cache_key, assets, INDEX_CACHE_TTL)
+    return assets
+
+def _check_access(user, path):
+    assets = get_media_assets(path)
+    if any(owner_id == user.id for kind, owner_id, object_id in assets):
+        return True
+
+    conversation_ids = [object_id for kind, owner_id, object_id in assets if kind == 'message']
+    if conversation_ids:
+        from messaging.models import ConversationParticipant
+        if ConversationParticipant.objects.filter(conversation_id__in=conversation_ids, user=user).exists():
+            return True
+
+    # Profile pictures and marketplace images are hidden across a block in either direction
+    public_owner_ids = [owner_id for kind, owner_id, object_id in assets if kind in ('profile', 'marketplace')]
+    if public_owner_ids:
+        blocked_ids = blocked_user_ids(user)
+        if any(owner_id not in blocked_ids for owner_id in public_owner_ids):
+            return True
+
+    # Verification documents and report evidence: only the owner and staff
+    return False
+
+def can_access_media(user, path):
+    """Return True if the user may download the file at path (relative to MEDIA_ROOT)"""
+    if user.is_staff:
+        # Moderators review reports, verification documents and reported messages
+        return True
+
+    if not _cache_is_shared():
+        # Invalidation would only reach this process
+        return _check_access(user, path)
+
+    generation = cache.get_or_set(_generation_key(user.id), lambda: uuid.uuid4().hex, None)
+    cache_key = _access_cache_key(user.id, generation, path)
+    allowed = cache.get(cache_key)
+    if allowed is None:
+        allowed = _check_access(user, path)
+        cache.set(cache_key, allowed, ACCESS_CACHE_TTL)
+    return allowed
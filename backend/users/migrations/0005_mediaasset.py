@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_existing_media(apps, schema_editor):
+    """Index files uploaded before access checks existed"""
+    MediaAsset = apps.get_model('users', 'MediaAsset')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Report = apps.get_model('users', 'Report')
+    Message = apps.get_model('messaging', 'Message')
+    Item = apps.get_model('marketplace', 'Item')
+
+    assets = []
+    for user in CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True):
+        assets.append(MediaAsset(path=user.profile_picture.name, kind='profile', owner_id=user.id))
+    for user in CustomUser.objects.exclude(id_document='').exclude(id_document__isnull=True):
+        assets.append(MediaAsset(path=user.id_document.name, kind='verification', owner_id=user.id))
+    for report in Report.objects.exclude(screenshot='').exclude(screenshot__isnull=True):
+        assets.append(MediaAsset(path=report.screenshot.name, kind='report', owner_id=report.reporter_id))
+    for item in Item.objects.exclude(image='').exclude(image__isnull=True):
+        assets.append(MediaAsset(path=item.image.name, kind='marketplace', owner_id=item.seller_id))
+    for message in Message.objects.exclude(media_file='').exclude(media_file__isnull=True):
+        paths = [message.media_file.name]
+        for by_width in (message.media_variants or {}).values():
+            paths.extend(by_width.values())
+        for path in paths:
+            assets.append(MediaAsset(
+                path=path, kind='message', owner_id=message.sender_id, object_id=str(message.conversation_id)
+            ))
+
+    MediaAsset.objects.bulk_create(assets, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_loginactivity'),
+        ('messaging', '0007_message_media_variants'),
+        ('marketplace', '0002_alter_payment_payment_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('kind', models.CharField(choices=[('message', 'Message Attachment'), ('profile', 'Profile Picture'), ('verification', 'Verification Document'), ('report', 'Report Evidence'), ('marketplace', 'Marketplace Image')], max_length=20)),
+                ('object_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='media_assets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(index_existing_media, migrations.RunPython.noop),
+    ]
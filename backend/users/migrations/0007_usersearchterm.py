@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    """Index existing users; later changes are indexed by the post_save signal"""
+    from users.search import search_terms
+
+    CustomUser = apps.get_model('users', 'CustomUser')
+    UserSearchTerm = apps.get_model('users', 'UserSearchTerm')
+    rows = []
+    for user_id, username, email in CustomUser.objects.values_list('id', 'username', 'email').iterator():
+        rows.extend(
+            UserSearchTerm(user_id=user_id, term=term, weight=weight)
+            for term, weight in search_terms(username, email).items()
+        )
+        if len(rows) >= 5000:
+            UserSearchTerm.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    UserSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_storedblob_alter_mediaasset_path_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'user'], name='users_users_term_5e03f7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchterm',
+            constraint=models.UniqueConstraint(fields=('user', 'term'), name='unique_user_search_term'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
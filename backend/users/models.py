@@ -2,6 +2,7 @@ from django.db import models
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from .storage import ContentAddressedStorage
 
 class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=15, unique=True)
@@ -66,6 +67,56 @@ class UserKey(models.Model):
             self.public_key_hash = hashlib.sha256(self.public_key.encode()).hexdigest()
         super().save(*args, **kwargs)
 
+class MediaAsset(models.Model):
+    """Maps an uploaded file under MEDIA_ROOT to the object that controls access to it"""
+    KIND_CHOICES = [
+        ('message', 'Message Attachment'),
+        ('profile', 'Profile Picture'),
+        ('verification', 'Verification Document'),
+        ('report', 'Report Evidence'),
+        ('marketplace', 'Marketplace Image'),
+    ]
+
+    # Not unique: a deduplicated blob can belong to several objects
+    path = models.CharField(max_length=255, db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='media_assets', null=True, blank=True)
+    # Conversation id for message attachments
+    object_id = models.CharField(max_length=64, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.path}"
+
+class StoredBlob(models.Model):
+    """A deduplicated upload in ContentAddressedStorage"""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+class UserSearchTerm(models.Model):
+    """A normalized prefix of a user's username or email, used by user search instead of LIKE scans"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=32)
+    # Higher for username matches and whole words, used to rank results
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'term'], name='unique_user_search_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.user_id}"
+
 class UserBlock(models.Model):
     blocker = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='blocking')
     blocked_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='blocked_by')
@@ -113,7 +164,7 @@ class Report(models.Model):
     report_type = models.CharField(max_length=10, choices=REPORT_TYPES)
     reason = models.TextField()
     additional_details = models.TextField(blank=True, null=True)
-    screenshot = models.ImageField(upload_to='report_evidence/', null=True, blank=True)
+    screenshot = models.ImageField(upload_to='report_evidence/', storage=ContentAddressedStorage(), null=True, blank=True)
     
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
     admin_notes = models.TextField(blank=True, null=True)
@@ -0,0 +1,69 @@
+# users/search.py
+import re
+from django.db.models import Count, Sum
+from .models import CustomUser, UserSearchTerm
+
+# Prefixes shorter than this match too many users to be useful
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 32
+MAX_QUERY_TERMS = 5
+
+USERNAME_WEIGHT = 3
+EMAIL_WEIGHT = 1
+# Added when the term is a whole word rather than a prefix of one
+WHOLE_WORD_BONUS = 1
+
+token_re = re.compile(r'[^\W_]+')
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in token_re.findall((text or '').lower())]
+
+def _add_prefixes(terms, word, weight):
+    word = word[:MAX_TERM_LENGTH]
+    for length in range(MIN_TERM_LENGTH, len(word) + 1):
+        term = word[:length]
+        term_weight = weight + WHOLE_WORD_BONUS if length == len(word) else weight
+        terms[term] = max(terms.get(term, 0), term_weight)
+
+def search_terms(username, email):
+    """Map each prefix of the username and email words to its weight"""
+    terms = {}
+    for word in tokenize(username):
+        _add_prefixes(terms, word, USERNAME_WEIGHT)
+    for word in tokenize(email):
+        _add_prefixes(terms, word, EMAIL_WEIGHT)
+    return terms
+
+def index_user(user):
+    """Bring the user's search terms in line with their current username and email"""
+    terms = search_terms(user.username, user.email)
+    existing = dict(UserSearchTerm.objects.filter(user=user).values_list('term', 'weight'))
+    if existing == terms:
+        return
+
+    stale = [term for term, weight in existing.items() if terms.get(term) != weight]
+    if stale:
+        UserSearchTerm.objects.filter(user=user, term__in=stale).delete()
+    UserSearchTerm.objects.bulk_create([
+        UserSearchTerm(user=user, term=term, weight=weight)
+        for term, weight in terms.items()
+        if existing.get(term) != weight
+    ], batch_size=500)
+
+def find_users(query):
+    """
+    Users with an indexed prefix for every word of the query, best matches first.
+    Returns an empty queryset when the query has no word long enough to search.
+    """
+    words = list(dict.fromkeys(word for word in tokenize(query) if len(word) >= MIN_TERM_LENGTH))[:MAX_QUERY_TERMS]
+    if not words:
+        return CustomUser.objects.none()
+
+    return CustomUser.objects.filter(
+        search_terms__term__in=words
+    ).annotate(
+        matched_terms=Count('search_terms'),
+        search_score=Sum('search_terms__weight')
+    ).filter(
+        matched_terms=len(words)
+    ).order_by('-search_score', 'username')
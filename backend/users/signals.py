@@ -1,9 +1,13 @@
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from .models import LoginActivity
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import CustomUser, UserKey
+from .models import CustomUser, UserKey, Report, UserBlock
+from .blocks import invalidate_blocks
+from .media_access import index_field_file, invalidate_media_access
+from .search import index_user
+from .storage import release_blob
 from messaging.utils import generate_key_pair
 import logging
 from django.contrib.auth.signals import user_logged_in
@@ -67,6 +71,35 @@ def generate_user_keys(sender, instance, created, **kwargs):
         except Exception as e:
             logger.error(f"Error generating keys for user {instance.username}: {e}")
 
+@receiver(post_save, sender=CustomUser)
+def index_user_media(sender, instance, update_fields=None, **kwargs):
+    """Register profile pictures and ID documents for protected media access checks"""
+    index_field_file(instance, 'profile_picture', 'profile', instance.id, update_fields=update_fields)
+    index_field_file(instance, 'id_document', 'verification', instance.id, update_fields=update_fields)
+
+@receiver(post_save, sender=CustomUser)
+def index_user_search(sender, instance, update_fields=None, **kwargs):
+    """Keep the user search index in step with username and email changes"""
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return
+    index_user(instance)
+
+@receiver(post_save, sender=Report)
+def index_report_media(sender, instance, update_fields=None, **kwargs):
+    index_field_file(instance, 'screenshot', 'report', instance.reporter_id, update_fields=update_fields)
+
+@receiver(post_delete, sender=Report)
+def release_report_media(sender, instance, **kwargs):
+    if instance.screenshot:
+        release_blob(instance.screenshot.name)
+
+@receiver(post_save, sender=UserBlock)
+@receiver(post_delete, sender=UserBlock)
+def refresh_block_cache(sender, instance, **kwargs):
+    """Both sides of a block see the change on their next request"""
+    invalidate_blocks(instance.blocker_id, instance.blocked_user_id)
+    invalidate_media_access(instance.blocker_id, instance.blocked_user_id)
+
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     # Mark request to avoid duplicate logging
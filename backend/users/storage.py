@@ -0,0 +1,71 @@
+# users/storage.py
+import hashlib
+import os
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = 'blobs/'
+
+# Model fields stored in ContentAddressedStorage, used to count blob references
+BLOB_FIELDS = [
+    ('messaging', 'Message', 'media_file'),
+    ('marketplace', 'Item', 'image'),
+    ('users', 'Report', 'screenshot'),
+]
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+def release_blob(name):
+    """Drop one reference to a blob; unreferenced blobs are removed by collect_media_blobs"""
+    from .models import StoredBlob
+
+    if is_blob_name(name):
+        StoredBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct upload once under its SHA-256 digest.
+    Saving identical content again returns the existing name and adds a reference.
+    """
+
+    def _digest(self, content):
+        sha256 = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            sha256.update(chunk)
+            size += len(chunk)
+        return sha256.hexdigest(), size
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{BLOB_PREFIX}{digest[:2]}/{digest}{extension}"
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        digest, size = self._digest(content)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        blob_name = self.blob_name(digest, name)
+
+        # Take the reference before looking at the file, so collect_media_blobs
+        # (which only deletes blobs whose count is still 0) cannot remove it from under us
+        while True:
+            blob, created = StoredBlob.objects.get_or_create(
+                name=blob_name,
+                defaults={'digest': digest, 'size': size, 'ref_count': 1}
+            )
+            if created or StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1):
+                break
+            # The blob was collected between the lookup and the increment
+
+        # Also re-creates a file that was collected just before the reference was taken
+        if not self.exists(blob_name):
+            saved_name = super()._save(blob_name, content)
+            if saved_name != blob_name:
+                # Another upload wrote the same blob concurrently
+                self.delete(saved_name)
+        return blob_name
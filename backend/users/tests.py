@@ -1,3 +1,377 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from friends.models import Notification
+from friends.notifications import deliver_notifications
+from marketplace.models import Cart, CartItem, Item
+from messaging.models import Conversation, ConversationParticipant, Message
+from .blocks import _cache_is_shared, get_blocks, is_blocked_between
+from .counters import get_unread_notification_count, get_cart_item_count
+from .management.commands import collect_media_blobs
+from .media_access import can_access_media
+from .models import CustomUser, StoredBlob, UserBlock, UserSearchTerm
+from .search import find_users
 
-# Create your tests here.
+
+class CachedCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.seller = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+
+    def test_notification_count_is_cached(self):
+        Notification.objects.create(user=self.user, notification_type='friend_request', content='hi')
+        self.assertEqual(get_unread_notification_count(self.user.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_notification_count(self.user.id), 1)
+
+    def test_notification_create_and_read_invalidate(self):
+        self.assertEqual(get_unread_notification_count(self.user.id), 0)
+        notification = Notification.objects.create(user=self.user, notification_type='friend_request', content='hi')
+        self.assertEqual(get_unread_notification_count(self.user.id), 1)
+
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(get_unread_notification_count(self.user.id), 0)
+
+        Notification.objects.create(user=self.user, notification_type='friend_request', content='again')
+        self.assertEqual(get_unread_notification_count(self.user.id), 1)
+        Notification.objects.filter(user=self.user, is_read=False).first().delete()
+        self.assertEqual(get_unread_notification_count(self.user.id), 0)
+
+    def test_bulk_delivery_invalidates(self):
+        self.assertEqual(get_unread_notification_count(self.user.id), 0)
+        deliver_notifications([self.user.id], 'group_invite', 'added you', related_user_id=self.seller.id)
+        self.assertEqual(get_unread_notification_count(self.user.id), 1)
+
+        Notification.objects.update(is_read=True)
+        deliver_notifications([self.user.id], 'group_invite', 'added you', related_user_id=self.seller.id, coalesce=True)
+        self.assertEqual(get_unread_notification_count(self.user.id), 1)
+
+    def test_cart_count_tracks_cart_items(self):
+        item = Item.objects.create(seller=self.seller, name='Lamp', description='A lamp', price=10)
+        self.assertEqual(get_cart_item_count(self.user.id), 0)
+
+        cart = Cart.objects.create(user=self.user)
+        cart_item = CartItem.objects.create(cart=cart, item=item, quantity=2)
+        self.assertEqual(get_cart_item_count(self.user.id), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_item_count(self.user.id), 2)
+
+        cart_item.quantity = 5
+        cart_item.save()
+        self.assertEqual(get_cart_item_count(self.user.id), 5)
+
+        cart.items.all().delete()
+        self.assertEqual(get_cart_item_count(self.user.id), 0)
+
+    def test_deleting_listed_item_invalidates_cart(self):
+        item = Item.objects.create(seller=self.seller, name='Lamp', description='A lamp', price=10)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, item=item, quantity=3)
+        self.assertEqual(get_cart_item_count(self.user.id), 3)
+
+        item.delete()
+        self.assertEqual(get_cart_item_count(self.user.id), 0)
+
+
+class BlockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Behave as with the shared Redis cache; the test settings use local memory
+        patcher = mock.patch('users.blocks._cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.other = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+
+    def test_block_set_is_loaded_once(self):
+        UserBlock.objects.create(blocker=self.other, blocked_user=self.user)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_blocks(user), (frozenset(), frozenset({self.other.id})))
+            self.assertTrue(is_blocked_between(user, self.other.id))
+
+        # A later request reads the cached set
+        next_request_user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_blocked_between(next_request_user, self.other.id))
+
+    def test_per_process_cache_is_not_used(self):
+        # The test settings use local memory, like a deployment without REDIS_URL
+        self.assertFalse(_cache_is_shared())
+        with mock.patch('users.blocks._cache_is_shared', return_value=False):
+            get_blocks(CustomUser.objects.get(pk=self.user.pk))
+            next_request_user = CustomUser.objects.get(pk=self.user.pk)
+            with self.assertNumQueries(1):
+                get_blocks(next_request_user)
+
+    def test_block_and_unblock_invalidate(self):
+        self.assertFalse(is_blocked_between(CustomUser.objects.get(pk=self.user.pk), self.other.id))
+        block = UserBlock.objects.create(blocker=self.user, blocked_user=self.other)
+        self.assertTrue(is_blocked_between(CustomUser.objects.get(pk=self.user.pk), self.other.id))
+        self.assertTrue(is_blocked_between(CustomUser.objects.get(pk=self.other.pk), self.user.id))
+
+        block.delete()
+        self.assertFalse(is_blocked_between(CustomUser.objects.get(pk=self.user.pk), self.other.id))
+        self.assertFalse(is_blocked_between(CustomUser.objects.get(pk=self.other.pk), self.user.id))
+
+
+class UserSearchIndexTests(TestCase):
+    def setUp(self):
+        self.john = CustomUser.objects.create_user(
+            username='john_doe', password='pw', email='jd@example.com', phone_number='100'
+        )
+        self.johanna = CustomUser.objects.create_user(
+            username='johanna', password='pw', email='johanna.doe@mail.org', phone_number='200'
+        )
+
+    def test_prefix_search_is_ranked(self):
+        self.assertEqual(list(find_users('jo')), [self.johanna, self.john])
+        self.assertEqual(list(find_users('doe')), [self.john, self.johanna])
+        self.assertEqual(list(find_users('john d')), [self.john])
+        # Queries split on '_' like usernames do
+        self.assertEqual(list(find_users('john_do')), [self.john])
+        self.assertEqual(list(find_users('example.com')), [self.john])
+        self.assertEqual(list(find_users('x')), [])
+
+    def test_username_change_reindexes(self):
+        self.john.username = 'jack'
+        self.john.save()
+        self.assertEqual(list(find_users('john')), [])
+        self.assertEqual(list(find_users('jac')), [self.john])
+
+        # Saves that do not touch username or email leave the index alone
+        with self.assertNumQueries(1):
+            self.john.save(update_fields=['last_login'])
+        self.assertTrue(UserSearchTerm.objects.filter(user=self.john, term='jack').exists())
+
+
+class ProtectedMediaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=False)
+        self.override.enable()
+        self.alice = CustomUser.objects.create_user(
+            username='alice', password='pw', email='alice@example.com', phone_number='100'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob', password='pw', email='bob@example.com', phone_number='200'
+        )
+        self.conversation = Conversation.objects.create(conversation_type='direct')
+        for user in (self.alice, self.bob):
+            ConversationParticipant.objects.create(conversation=self.conversation, user=user)
+
+        self.content = bytes(range(256)) * 4
+        self.message = Message.objects.create(
+            conversation=self.conversation, sender=self.alice, media_type='image',
+            media_file=SimpleUploadedFile('photo.jpg', self.content, content_type='image/jpeg')
+        )
+        self.url = f"/protected-media/{self.message.media_file.name}"
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def fetch(self, user, url=None, **headers):
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        return self.client.get(url or self.url, **headers)
+
+
+class ProtectedMediaRangeTests(ProtectedMediaTestCase):
+    def test_full_file(self):
+        response = self.fetch(self.bob)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_byte_range(self):
+        response = self.fetch(self.bob, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_suffix_range(self):
+        response = self.fetch(self.bob, HTTP_RANGE='bytes=-16')
+        self.assertEqual(response.status_code, 206)
+        size = len(self.content)
+        self.assertEqual(response['Content-Range'], f"bytes {size - 16}-{size - 1}/{size}")
+        self.assertEqual(b''.join(response.streaming_content), self.content[-16:])
+
+    def test_unsatisfiable_range(self):
+        response = self.fetch(self.bob, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(self.content)}")
+
+    def test_if_none_match(self):
+        etag = self.fetch(self.bob)['ETag']
+        response = self.fetch(self.bob, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # A stale If-Range gets the whole file rather than a range of the new one
+        response = self.fetch(self.bob, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_asgi_streams_chunks_asynchronously(self):
+        await sync_to_async(self.async_client.force_login)(self.bob)
+        with mock.patch('social_media.views.STREAM_CHUNK_SIZE', 100):
+            response = await self.async_client.get(self.url, headers={'Range': 'bytes=10-'})
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(chunks), 11)
+        self.assertEqual(b''.join(chunks), self.content[10:])
+
+
+class MediaAccessTests(ProtectedMediaTestCase):
+    def setUp(self):
+        super().setUp()
+        # Behave as with the shared Redis cache; the test settings use local memory
+        patcher = mock.patch('users.media_access._cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.carol = CustomUser.objects.create_user(
+            username='carol', password='pw', email='carol@example.com', phone_number='300'
+        )
+        self.item = Item.objects.create(
+            seller=self.alice, name='Lamp', description='A lamp', price=10,
+            image=SimpleUploadedFile('lamp.jpg', b'lamp image', content_type='image/jpeg')
+        )
+        self.item_url = f"/protected-media/{self.item.image.name}"
+
+    def test_participants_only_for_message_media(self):
+        self.assertEqual(self.fetch(self.alice).status_code, 200)
+        self.assertEqual(self.fetch(self.bob).status_code, 200)
+        self.assertEqual(self.fetch(self.carol).status_code, 404)
+        self.assertEqual(self.fetch(self.carol, '/protected-media/message_media/missing.jpg').status_code, 404)
+
+    def test_anonymous_users_are_sent_to_login(self):
+        response = self.fetch(None)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+
+    def test_item_images_are_hidden_across_blocks(self):
+        self.assertEqual(self.fetch(self.carol, self.item_url).status_code, 200)
+        UserBlock.objects.create(blocker=self.alice, blocked_user=self.carol)
+        self.assertEqual(self.fetch(self.carol, self.item_url).status_code, 404)
+        # The seller still sees their own image
+        self.assertEqual(self.fetch(self.alice, self.item_url).status_code, 200)
+
+    def test_membership_change_invalidates_cached_decision(self):
+        path = self.message.media_file.name
+        self.assertTrue(can_access_media(self.bob, path))
+        self.assertFalse(can_access_media(self.carol, path))
+
+        ConversationParticipant.objects.filter(conversation=self.conversation, user=self.bob).delete()
+        ConversationParticipant.objects.create(conversation=self.conversation, user=self.carol)
+        self.assertFalse(can_access_media(self.bob, path))
+        self.assertTrue(can_access_media(self.carol, path))
+
+    def test_decisions_are_not_cached_in_a_per_process_cache(self):
+        path = self.message.media_file.name
+        with mock.patch('users.media_access._cache_is_shared', return_value=False):
+            self.assertTrue(can_access_media(self.bob, path))
+            # Removal on another worker would not reach this process's cache
+            ConversationParticipant.objects.filter(user=self.bob).update(conversation=Conversation.objects.create())
+            self.assertFalse(can_access_media(self.bob, path))
+
+    def test_block_change_invalidates_cached_decision(self):
+        path = self.item.image.name
+        self.assertTrue(can_access_media(self.carol, path))
+
+        block = UserBlock.objects.create(blocker=self.carol, blocked_user=self.alice)
+        self.assertFalse(can_access_media(CustomUser.objects.get(pk=self.carol.pk), path))
+
+        block.delete()
+        self.assertTrue(can_access_media(CustomUser.objects.get(pk=self.carol.pk), path))
+
+
+class BlobStorageTests(ProtectedMediaTestCase):
+    def send_copy(self):
+        return Message.objects.create(
+            conversation=self.conversation, sender=self.bob, media_type='image',
+            media_file=SimpleUploadedFile('copy.jpg', self.content, content_type='image/jpeg')
+        )
+
+    def blob_exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_identical_uploads_share_one_blob(self):
+        copy = self.send_copy()
+        self.assertEqual(copy.media_file.name, self.message.media_file.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(self.content))
+
+    def test_deleting_releases_and_collect_removes_unreferenced(self):
+        copy = self.send_copy()
+        name = copy.media_file.name
+
+        copy.delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        call_command('collect_media_blobs', '--grace-hours', '0', stdout=StringIO())
+        self.assertTrue(self.blob_exists(name))
+
+        self.message.delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 0)
+        call_command('collect_media_blobs', '--grace-hours', '0', '--dry-run', stdout=StringIO())
+        self.assertTrue(self.blob_exists(name))
+
+        call_command('collect_media_blobs', '--grace-hours', '0', stdout=StringIO())
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(self.blob_exists(name))
+
+    def test_collect_recounts_drifted_references(self):
+        StoredBlob.objects.update(ref_count=0)
+        call_command('collect_media_blobs', '--grace-hours', '0', stdout=StringIO())
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(self.blob_exists(self.message.media_file.name))
+
+    def test_collect_keeps_blob_referenced_during_the_recount(self):
+        name = self.message.media_file.name
+        self.message.delete()
+        blob_models = collect_media_blobs._blob_models
+        calls = []
+
+        # An identical upload takes a reference after the counts were read,
+        # before its message is saved
+        def upload_during_recount():
+            if not calls:
+                StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+            calls.append(1)
+            return blob_models()
+
+        with mock.patch.object(collect_media_blobs, '_blob_models', side_effect=upload_during_recount):
+            call_command('collect_media_blobs', '--grace-hours', '0', stdout=StringIO())
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(self.blob_exists(name))
+
+    def test_upload_recreates_a_collected_file(self):
+        name = self.message.media_file.name
+        os.remove(os.path.join(self.media_root, name))
+
+        self.assertEqual(self.send_copy().media_file.name, name)
+        self.assertTrue(self.blob_exists(name))
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 2)
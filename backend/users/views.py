@@ -6,6 +6,7 @@ from django.contrib.auth import authenticate, login, logout
 from django.db.models import Q
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm, VerificationForm, PasswordResetRequestForm, PasswordResetVerifyForm, SetNewPasswordForm, UserReportForm, MessageReportForm, ItemReportForm
 from .models import UserBlock
+from .blocks import get_blocks
 from .models import CustomUser, PasswordResetRequest, Report, UserKey, LoginActivity
 from django.utils import timezone
 import pyotp
@@ -569,7 +570,7 @@ def block_user(request, user_id):
         return redirect('profile')
     
     # Check if already blocked
-    if UserBlock.objects.filter(blocker=request.user, blocked_user=user_to_block).exists():
+    if user_to_block.id in get_blocks(request.user)[0]:
         messages.info(request, f"You have already blocked {user_to_block.username}.")
         return redirect('friend_list')
     
@@ -579,10 +580,8 @@ def block_user(request, user_id):
         # Check if they are friends before blocking
         from django.db.models import Q
         from friends.models import FriendRequest
-        were_friends = FriendRequest.objects.filter(
-            (Q(sender=request.user) & Q(receiver=user_to_block) & Q(status='accepted')) |
-            (Q(sender=user_to_block) & Q(receiver=request.user) & Q(status='accepted'))
-        ).exists()
+        from friends.friendships import are_friends
+        were_friends = are_friends(request.user, user_to_block.id)
         
         # Store this information in the session
         request.session[f'were_friends_{user_id}'] = were_friends
@@ -594,7 +593,7 @@ def block_user(request, user_id):
             reason=reason
         )
         
-        # Remove any existing friend relationship
+        # Remove any existing friend relationship (signals drop the friendship edges)
         FriendRequest.objects.filter(
             (Q(sender=request.user) & Q(receiver=user_to_block)) |
             (Q(sender=user_to_block) & Q(receiver=request.user))
@@ -693,7 +692,7 @@ def profile(request, username=None):
     # Check if this user is blocked
     is_blocked = False
     if not is_own_profile:
-        is_blocked = UserBlock.objects.filter(blocker=request.user, blocked_user=user).exists()
+        is_blocked = user.id in get_blocks(request.user)[0]
     
     show_private_keys_message = has_keys and not has_private_keys
 